@@ -0,0 +1,36 @@
+from collections import Counter
+
+import pytest
+from django.core.cache import cache
+from recipes import activity
+from recipes.tests.factories import build_fixture
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(settings, tmp_path, monkeypatch):
+    """Файлы, метки версий, кэш и буфер событий у каждого теста свои."""
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.VERSION_STAMPS_ROOT = str(tmp_path / 'versions')
+    settings.PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher'
+    ]
+    monkeypatch.setattr(activity, '_events', Counter())
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def data(db):
+    """Данные check_query_counts: по три строки во всех списках."""
+    return build_fixture(3)
+
+
+@pytest.fixture
+def me(data):
+    return data.clients['me']
+
+
+@pytest.fixture
+def anon(data):
+    return data.clients['anon']
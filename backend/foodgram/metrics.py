@@ -0,0 +1,72 @@
+import os
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+LABELS = ('view', 'method')
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_latency_seconds',
+    'Время обработки запроса',
+    LABELS,
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Количество запросов к базе на один запрос',
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, float('inf')),
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes',
+    'Размер тела ответа',
+    LABELS,
+    buckets=(
+        256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+        float('inf'),
+    ),
+)
+REQUEST_ERRORS = Counter(
+    'foodgram_request_errors_total',
+    'Ответы с кодом 4xx и 5xx',
+    LABELS + ('status',),
+)
+
+
+def is_metrics_client(request):
+    """
+    Можно ли отдавать метрики: запрос пришёл из сети
+    METRICS_ALLOWED_NETWORKS или от сотрудника.
+    """
+    if request.user.is_staff:
+        return True
+    try:
+        address = ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ip_network(network)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics_view(request):
+    """
+    Отдаёт метрики в текстовом формате Prometheus только
+    разрешённым клиентам.
+    Если задан PROMETHEUS_MULTIPROC_DIR, метрики собираются
+    со всех воркеров gunicorn.
+    """
+    if not is_metrics_client(request):
+        return HttpResponseForbidden()
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
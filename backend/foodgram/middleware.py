@@ -0,0 +1,206 @@
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from foodgram import metrics
+from foodgram.routers import get_replicas, use_replicas
+
+logger = logging.getLogger('foodgram.slow_requests')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+NORMALIZE_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)'), '(...)'),
+    (re.compile(r'%s'), '?'),
+)
+
+
+def normalize_sql(sql):
+    """Приводит SQL к шаблону без значений, чтобы находить повторы."""
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class QueryCollector:
+    """Считает запросы к базе и их время, группируя по шаблону SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = defaultdict(lambda: [0, 0.0])
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            statement = self.statements[normalize_sql(sql)]
+            statement[0] += 1
+            statement[1] += elapsed
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторяют уже выполненный шаблон."""
+        return sum(count - 1 for count, _ in self.statements.values())
+
+    def top_statements(self, limit=5):
+        """Самые затратные по суммарному времени шаблоны запросов."""
+        statements = sorted(
+            self.statements.items(), key=lambda item: item[1][1],
+            reverse=True
+        )
+        return [
+            {'sql': sql, 'count': count, 'ms': round(duration * 1000, 2)}
+            for sql, (count, duration) in statements[:limit]
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает запросы к базе и их время для каждого запроса к API.
+    Добавляет заголовки Server-Timing, X-DB-Queries
+    и X-DB-Duplicate-Queries, а медленные или «шумные» запросы
+    пишет в лог foodgram.slow_requests.
+    Включается настройкой QUERY_INSTRUMENTATION.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        request.db_queries = collector
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        db_ms = collector.duration * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{collector.count} queries", '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        response['X-DB-Queries'] = collector.count
+        response['X-DB-Duplicate-Queries'] = collector.duplicates
+        if (
+            duration * 1000 >= settings.SLOW_REQUEST_MS
+            or collector.count >= settings.SLOW_REQUEST_QUERIES
+            or any(
+                count >= settings.N_PLUS_ONE_THRESHOLD
+                for count, _ in collector.statements.values()
+            )
+        ):
+            logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'ms': round(duration * 1000, 2),
+                'db_ms': round(db_ms, 2),
+                'queries': collector.count,
+                'duplicates': collector.duplicates,
+                'top': collector.top_statements(),
+            }, ensure_ascii=False))
+        return response
+
+
+def get_view_label(view_func, request):
+    """Имя представления и действия, например RecipeViewSet.list."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class QueryCounter:
+    """Считает запросы к базе без разбора SQL."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Собирает гистограммы времени ответа, числа запросов к базе
+    и размера ответа, а также счётчик ошибок по представлениям.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_label(view_func, request)
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        labels = (
+            getattr(request, 'metrics_view', 'unresolved'), request.method
+        )
+        metrics.REQUEST_LATENCY.labels(*labels).observe(
+            time.perf_counter() - start
+        )
+        metrics.REQUEST_QUERIES.labels(*labels).observe(counter.count)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.labels(*labels).observe(
+                len(response.content)
+            )
+        if response.status_code >= 400:
+            metrics.REQUEST_ERRORS.labels(
+                *labels, response.status_code
+            ).inc()
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Отправляет чтение в безопасных запросах на реплики.
+    Клиент, который недавно что-то изменил, REPLICA_STICKY_SECONDS
+    читает из основной базы, чтобы не увидеть данные до своей записи.
+    Такой клиент помечается только cookie: она доходит до любого
+    воркера, а кеш по умолчанию у каждого воркера свой.
+    Не используется, если реплики не настроены.
+    """
+
+    cookie_name = 'db_primary'
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in SAFE_METHODS
+        pinned = writes or self.cookie_name in request.COOKIES
+        with use_replicas(not pinned):
+            response = self.get_response(request)
+        if writes and response.status_code < 400:
+            response.set_cookie(
+                self.cookie_name, '1', httponly=True, samesite='Lax',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+            )
+        return response
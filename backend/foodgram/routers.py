@@ -0,0 +1,57 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_PREFIX = 'replica'
+
+# Разрешено ли читать с реплик. По умолчанию всё идёт в основную базу:
+# реплики включает ReplicaRoutingMiddleware для безопасных запросов.
+_use_replicas = ContextVar('use_replicas', default=False)
+
+
+def get_replicas():
+    return [
+        alias for alias in settings.DATABASES
+        if alias.startswith(REPLICA_PREFIX)
+    ]
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """Включает или выключает чтение с реплик внутри блока."""
+    token = _use_replicas.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Пишет в основную базу, а читает с реплик, только если это разрешено
+    и не идёт транзакция в основной базе.
+    """
+
+    def __init__(self):
+        self.replicas = get_replicas()
+
+    def db_for_read(self, model, **hints):
+        if (
+            not self.replicas
+            or not _use_replicas.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
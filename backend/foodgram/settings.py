@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -29,6 +30,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.MetricsMiddleware',
+    'foodgram.middleware.QueryInstrumentationMiddleware',
+    'foodgram.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +73,23 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения через запятую: хосты PostgreSQL (host или host:port)
+# либо, для SQLite, пути к файлам баз.
+for number, replica in enumerate(filter(None, os.getenv(
+    'DB_REPLICAS', default=''
+).split(','))):
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        location = {'NAME': replica}
+    else:
+        host, _, port = replica.partition(':')
+        location = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -107,7 +128,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -126,3 +147,43 @@ DJOSER = {
 }
 
 DATA_ROOT = os.path.join(BASE_DIR, 'data')
+
+VERSION_STAMPS_ROOT = os.getenv(
+    'VERSION_STAMPS_ROOT',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram_versions')
+)
+
+QUERY_INSTRUMENTATION = os.getenv(
+    'QUERY_INSTRUMENTATION', default='False'
+) == 'True'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', default=500))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', default=50))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', default=10))
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=10000))
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=300))
+
+# Сети через запятую, из которых можно читать /api/metrics;
+# сотрудникам, вошедшим в админку, метрики доступны всегда.
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.getenv(
+        'METRICS_ALLOWED_NETWORKS', default='127.0.0.1/32,::1/128'
+    ).split(',') if network.strip()
+]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
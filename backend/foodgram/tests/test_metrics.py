@@ -0,0 +1,22 @@
+import pytest
+from users.models import User
+
+
+@pytest.mark.parametrize('address, status', (
+    ('127.0.0.1', 200), ('10.0.0.5', 403),
+))
+def test_metrics_are_served_to_allowed_networks(client, address, status):
+    response = client.get('/api/metrics', REMOTE_ADDR=address)
+
+    assert response.status_code == status
+
+
+def test_metrics_are_served_to_staff(client, db, settings):
+    settings.METRICS_ALLOWED_NETWORKS = []
+    client.force_login(User.objects.create_user(
+        username='admin', email='admin@example.com', is_staff=True))
+
+    response = client.get('/api/metrics', REMOTE_ADDR='10.0.0.5')
+
+    assert response.status_code == 200
+    assert b'foodgram_request_latency' in response.content
@@ -0,0 +1,59 @@
+import json
+import logging
+
+import pytest
+from recipes.models import Tag
+
+
+@pytest.fixture
+def instrumented(settings, db):
+    """Инструментирование включено, пороги лога выше одного запроса."""
+    settings.QUERY_INSTRUMENTATION = True
+    settings.SLOW_REQUEST_MS = 60 * 1000
+    settings.SLOW_REQUEST_QUERIES = 50
+    settings.N_PLUS_ONE_THRESHOLD = 10
+    Tag.objects.create(name='Завтрак', color='#000000', slug='breakfast')
+    return settings
+
+
+def test_query_headers_count_queries(client, instrumented, caplog):
+    # Список тегов без авторизации читается одним запросом.
+    with caplog.at_level(logging.WARNING, logger='foodgram.slow_requests'):
+        response = client.get('/api/tags/')
+
+    assert response.status_code == 200
+    assert response['X-DB-Queries'] == '1'
+    assert response['X-DB-Duplicate-Queries'] == '0'
+    assert 'db;dur=' in response['Server-Timing']
+    assert '"1 queries"' in response['Server-Timing']
+    assert 'total;dur=' in response['Server-Timing']
+    assert not caplog.records
+
+
+@pytest.mark.parametrize('threshold, value', (
+    ('SLOW_REQUEST_QUERIES', 1),
+    ('N_PLUS_ONE_THRESHOLD', 1),
+    ('SLOW_REQUEST_MS', 0),
+))
+def test_noisy_request_is_logged(
+    client, instrumented, caplog, threshold, value
+):
+    setattr(instrumented, threshold, value)
+
+    with caplog.at_level(logging.WARNING, logger='foodgram.slow_requests'):
+        client.get('/api/tags/?name=breakfast')
+
+    [record] = caplog.records
+    entry = json.loads(record.getMessage())
+    assert entry['path'] == '/api/tags/?name=breakfast'
+    assert entry['status'] == 200
+    assert entry['queries'] == 1
+    assert entry['top'][0]['count'] == 1
+    assert 'recipes_tag' in entry['top'][0]['sql']
+
+
+def test_instrumentation_is_off_by_default(client, db):
+    response = client.get('/api/tags/')
+
+    assert 'X-DB-Queries' not in response
+    assert 'Server-Timing' not in response
@@ -0,0 +1,94 @@
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.db import connections, router
+from django.test import Client
+from foodgram.middleware import ReplicaRoutingMiddleware
+from foodgram.routers import ReplicaRouter
+from recipes.models import Tag
+from users.models import User
+
+REPLICA = 'replica_0'
+
+# Роутер не читает с реплик внутри транзакции основной базы,
+# поэтому тестам нужны настоящие коммиты.
+pytestmark = pytest.mark.django_db(
+    transaction=True, databases=('default', REPLICA)
+)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def replica(django_db_setup, django_db_blocker):
+    """
+    Вторая база SQLite в роли реплики: схема та же, данные свои,
+    поэтому по ответу видно, из какой базы шло чтение. Миграции
+    и очистка между тестами должны видеть её таблицы.
+    """
+    settings.DATABASES[REPLICA] = {
+        **settings.DATABASES['default'], 'NAME': '', 'TEST': {},
+    }
+    router.__dict__.pop('routers', None)
+    with mock.patch.object(
+        ReplicaRouter, 'allow_migrate', return_value=True
+    ):
+        with django_db_blocker.unblock():
+            connections[REPLICA].creation.create_test_db(verbosity=0)
+        yield REPLICA
+        with django_db_blocker.unblock():
+            connections[REPLICA].creation.destroy_test_db('', verbosity=0)
+    del connections[REPLICA]
+    del settings.DATABASES[REPLICA]
+    router.__dict__.pop('routers', None)
+
+
+@pytest.fixture
+def tags():
+    Tag.objects.create(name='Основная', color='#000000', slug='primary')
+    Tag.objects.using(REPLICA).create(
+        name='Реплика', color='#FFFFFF', slug='replica')
+
+
+def tag_slugs(client):
+    response = client.get('/api/tags/')
+    assert response.status_code == 200
+    return [tag['slug'] for tag in response.json()]
+
+
+def register(client, name):
+    return client.post('/api/users/', {
+        'username': name, 'email': f'{name}@example.com',
+        'first_name': 'Имя', 'last_name': 'Фамилия',
+        'password': 'Replica-password-1',
+    })
+
+
+def test_safe_requests_read_from_replica(tags):
+    assert tag_slugs(Client()) == ['replica']
+
+
+def test_writes_go_to_primary(tags):
+    response = register(Client(), 'writer')
+
+    assert response.status_code == 201
+    assert User.objects.filter(username='writer').exists()
+    assert not User.objects.using(REPLICA).exists()
+
+
+def test_reads_stick_to_primary_after_write(tags):
+    client = Client()
+    assert register(client, 'writer').status_code == 201
+
+    cookie = client.cookies[ReplicaRoutingMiddleware.cookie_name]
+    assert cookie['max-age'] == settings.REPLICA_STICKY_SECONDS
+    assert tag_slugs(client) == ['primary']
+    # Без cookie тот же пользователь снова читает с реплики.
+    assert tag_slugs(Client()) == ['replica']
+
+
+def test_failed_write_does_not_stick(tags):
+    client = Client()
+    assert client.post('/api/users/', {}).status_code == 400
+
+    assert ReplicaRoutingMiddleware.cookie_name not in client.cookies
+    assert tag_slugs(client) == ['replica']
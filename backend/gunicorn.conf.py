@@ -0,0 +1,17 @@
+import os
+import shutil
+
+
+def on_starting(server):
+    """Очищает метрики прошлого запуска перед стартом воркеров."""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    """Помечает завершившийся воркер в метриках Prometheus."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,63 @@
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.utils import timezone
+from recipes.models import RecipeActivity, activity_bucket
+
+# Буфер событий воркера сбрасывается в базу, когда в нём набирается
+# FLUSH_EVENTS событий или самому старому исполняется FLUSH_SECONDS:
+# при новом событии или в конце любого запроса. Остаток буфера
+# записывается при завершении процесса.
+FLUSH_EVENTS = 100
+FLUSH_SECONDS = 30
+
+_events = Counter()
+_started = None
+_lock = threading.Lock()
+
+
+def record_event(recipe_id, kind):
+    """
+    Учитывает событие рецепта: favorites, carts или views.
+    События копятся в памяти воркера и пишутся в RecipeActivity пачкой,
+    поэтому обычно не стоят ни одного запроса.
+    """
+    global _started
+    with _lock:
+        if not _events:
+            _started = time.monotonic()
+        _events[(int(recipe_id), activity_bucket(timezone.now()), kind)] += 1
+        if (
+            sum(_events.values()) < FLUSH_EVENTS
+            and time.monotonic() - _started < FLUSH_SECONDS
+        ):
+            return
+        events = dict(_events)
+        _events.clear()
+    RecipeActivity.objects.add_events(events)
+
+
+def flush_due_events(**kwargs):
+    """
+    Записывает буфер, если самому старому событию исполнилось
+    FLUSH_SECONDS. Вызывается в конце каждого запроса, чтобы события
+    не залеживались в воркере, к которому новые события не приходят.
+    """
+    with _lock:
+        if not _events or time.monotonic() - _started < FLUSH_SECONDS:
+            return
+    flush_events()
+
+
+def flush_events():
+    """Сразу записывает накопленные в воркере события."""
+    with _lock:
+        events = dict(_events)
+        _events.clear()
+    if events:
+        RecipeActivity.objects.add_events(events)
+
+
+atexit.register(flush_events)
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from recipes.models import (AmountIngredient, Cart, Favorites, Ingredient,
-                            Recipe, Tag)
+from recipes.models import (AmountIngredient, Cart, Favorites, FeedItem,
+                            Ingredient, Recipe, RecipeActivity,
+                            ShoppingListItem, Tag, TrendingRecipe)
 
 
 @admin.register(Ingredient)
@@ -26,14 +27,14 @@ class IngredientLnline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     """Отображает рецепты в панели администратора."""
-    list_display = ('author', 'name', 'cooking_time')
+    list_display = (
+        'author', 'name', 'cooking_time', 'favorites_count', 'in_carts_count'
+    )
+    readonly_fields = ('favorites_count', 'in_carts_count')
     search_fields = ('name', 'author', 'tags')
     list_filter = ('author', 'name', 'tags')
     inlines = (IngredientLnline,)
 
-    def count_favorites(self, obj):
-        return obj.favorites.count()
-
 
 @admin.register(Favorites)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -49,3 +50,34 @@ class CartAdmin(admin.ModelAdmin):
     list_display = ('recipe',)
     search_fields = ('user',)
     list_filter = ('user',)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    """Отображает списки покупок в панели администратора."""
+    list_display = ('user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
+    list_filter = ('user',)
+
+
+@admin.register(FeedItem)
+class FeedItemAdmin(admin.ModelAdmin):
+    """Отображает ленты подписок в панели администратора."""
+    list_display = ('user', 'recipe', 'author', 'pub_date')
+    search_fields = ('user__username',)
+    list_filter = ('user',)
+
+
+@admin.register(RecipeActivity)
+class RecipeActivityAdmin(admin.ModelAdmin):
+    """Отображает почасовую активность по рецептам."""
+    list_display = ('recipe', 'bucket', 'favorites', 'carts', 'views')
+    list_select_related = ('recipe',)
+    search_fields = ('recipe__name',)
+
+
+@admin.register(TrendingRecipe)
+class TrendingRecipeAdmin(admin.ModelAdmin):
+    """Отображает рейтинг популярных рецептов."""
+    list_display = ('rank', 'recipe', 'score')
+    list_select_related = ('recipe',)
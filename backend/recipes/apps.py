@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     name = 'recipes'
     verbose_name = "Рецепты"
+
+    def ready(self):
+        import recipes.signals  # noqa: F401
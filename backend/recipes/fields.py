@@ -0,0 +1,39 @@
+from recipes.images import IMAGE_SIZES
+from rest_framework.fields import Field
+
+
+def build_image_url(recipe, size, context):
+    """Адрес копии изображения, абсолютный при наличии запроса."""
+    url = recipe.get_image_url(size)
+    request = context.get('request')
+    if url and request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class ImageSizeField(Field):
+    """Адрес копии изображения рецепта заданного размера."""
+
+    def __init__(self, size, **kwargs):
+        self.size = size
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return build_image_url(recipe, self.size, self.context)
+
+
+class ImageSizesField(Field):
+    """Адреса всех копий изображения рецепта: {размер: адрес}."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return {
+            size: build_image_url(recipe, size, self.context)
+            for size in IMAGE_SIZES
+        }
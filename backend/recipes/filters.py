@@ -1,22 +1,46 @@
+import threading
+
 from django_filters import FilterSet, filters
-from recipes.models import Ingredient, Recipe, Tag
-from rest_framework.filters import SearchFilter
+from foodgram.routers import use_replicas
+from recipes.models import Recipe, Tag
+from recipes.versions import get_version
 from users.models import User
 
+_tag_bits = {}
+_tag_bits_version = None
+_lock = threading.Lock()
 
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
 
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+def get_tag_bits():
+    """
+    Возвращает словарь slug -> маска тега в памяти воркера.
+    Словарь перечитывается из основной базы, когда меняется
+    версия модели Tag.
+    """
+    global _tag_bits, _tag_bits_version
+    version = get_version(Tag)
+    if version != _tag_bits_version:
+        with _lock:
+            if version != _tag_bits_version:
+                with use_replicas(False):
+                    _tag_bits = {
+                        slug: 1 << bit for slug, bit
+                        in Tag.objects.values_list('slug', 'bit')
+                    }
+                _tag_bits_version = version
+    return _tag_bits
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_bits()]
 
 
 class RecipeFilterSet(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug'
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_tags'
+    )
+    all_tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_all_tags'
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.NumberFilter(method='filter_is_favorited')
@@ -25,14 +49,33 @@ class RecipeFilterSet(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'all_tags', 'author', 'is_favorited',
+            'is_in_shopping_cart',
+        )
+
+    @staticmethod
+    def get_tag_mask(slugs):
+        tag_bits = get_tag_bits()
+        mask = 0
+        for slug in slugs:
+            mask |= tag_bits.get(slug, 0)
+        return mask
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов."""
+        return queryset.with_tags(self.get_tag_mask(value))
+
+    def filter_all_tags(self, queryset, name, value):
+        """Рецепты со всеми тегами сразу."""
+        return queryset.with_tags(self.get_tag_mask(value), match_all=True)
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(cart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
@@ -0,0 +1,38 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Наибольшая сторона производных изображений рецепта в пикселях.
+IMAGE_SIZES = {
+    'thumbnail': 200,
+    'card': 480,
+    'full': 1280,
+}
+IMAGE_FORMAT = 'WEBP'
+IMAGE_QUALITY = 80
+DERIVATIVES_DIR = 'recipes/images/sizes/'
+
+
+def make_image_sizes(image):
+    """
+    Делает уменьшенные копии изображения рецепта в формате WebP
+    и возвращает словарь {размер: имя файла в хранилище}.
+    """
+    with image.open('rb'), Image.open(image) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        base = os.path.splitext(os.path.basename(image.name))[0]
+        sizes = {}
+        for size, side in IMAGE_SIZES.items():
+            copy = original.copy()
+            copy.thumbnail((side, side), Image.LANCZOS)
+            buffer = BytesIO()
+            copy.save(buffer, IMAGE_FORMAT, quality=IMAGE_QUALITY)
+            sizes[size] = image.storage.save(
+                f'{DERIVATIVES_DIR}{base}_{size}.webp',
+                ContentFile(buffer.getvalue())
+            )
+    return sizes
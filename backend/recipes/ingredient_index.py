@@ -0,0 +1,62 @@
+import json
+import threading
+from bisect import bisect_left
+
+from foodgram.routers import use_replicas
+from recipes.models import Ingredient
+from recipes.versions import get_version
+
+# Символ, который больше любого символа в названии ингредиента.
+MAX_CHAR = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    """
+    Отсортированный по названию справочник ингредиентов в памяти.
+    Отвечает на регистронезависимые поисковые запросы по началу названия
+    бинарным поиском и отдаёт заранее отрендеренный JSON.
+    """
+
+    def __init__(self, ingredients):
+        rows = sorted(
+            (name.lower(), pk, json.dumps(
+                {'id': pk, 'name': name, 'measurement_unit': unit},
+                ensure_ascii=False, separators=(',', ':'),
+            ).encode())
+            for pk, name, unit in ingredients
+        )
+        self.keys = [key for key, _, _ in rows]
+        self.rendered = [rendered for _, _, rendered in rows]
+
+    def search(self, prefix='', limit=None):
+        """Возвращает JSON-массив ингредиентов, начинающихся с prefix."""
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + MAX_CHAR, start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return b'[' + b','.join(self.rendered[start:end]) + b']'
+
+
+_index = None
+_version = None
+_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """
+    Возвращает индекс ингредиентов текущего воркера.
+    Индекс перестраивается, когда меняется версия модели Ingredient,
+    по основной базе: отстающая реплика дала бы старые данные
+    под новой версией.
+    """
+    global _index, _version
+    version = get_version(Ingredient)
+    if version != _version:
+        with _lock:
+            if version != _version:
+                with use_replicas(False):
+                    _index = IngredientIndex(Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit'))
+                _version = version
+    return _index
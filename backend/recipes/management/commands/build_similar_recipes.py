@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from recipes import similarity
+from recipes.models import (RECIPE_CHANGES_RETENTION, AmountIngredient, Recipe,
+                            RecipeChange, SimilarRecipe, SimilarRecipesBuild)
+from recipes.versions import bump_version
+
+# Записи журнала из параллельных транзакций могут стать видны
+# с опозданием, поэтому изменения перечитываются с запасом.
+CHANGES_OVERLAP = timedelta(minutes=1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает для каждого рецепта самые похожие рецепты по '
+        'ингредиентам и тегам; по умолчанию пересчитывает только '
+        'затронутые изменениями с прошлого запуска'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours', type=int, default=10,
+            help='Сколько похожих рецептов хранить для каждого'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько рецептов обрабатывает процесс за раз'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов'
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты'
+        )
+
+    def load_matrix(self):
+        """
+        id рецептов, нормированная матрица их признаков и номер
+        первого столбца тегов.
+        """
+        recipe_ids = np.array(
+            Recipe.objects.order_by('id').values_list('id', flat=True),
+            dtype=np.int64,
+        )
+        ingredients = np.array(
+            AmountIngredient.objects.values_list('recipe_id', 'ingredient_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        tags = np.array(
+            Recipe.tags.through.objects.values_list('recipe_id', 'tag_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        # Теги идут в столбцах после всех ингредиентов.
+        offset = ingredients[:, 1].max(initial=0) + 1
+        pairs = np.concatenate((ingredients, tags + (0, offset)))
+        pairs = pairs[np.isin(pairs[:, 0], recipe_ids)]
+        matrix = similarity.feature_matrix(
+            np.searchsorted(recipe_ids, pairs[:, 0]),
+            pairs[:, 1],
+            (len(recipe_ids), offset + tags[:, 1].max(initial=0) + 1),
+        )
+        return recipe_ids, matrix, offset
+
+    def affected_rows(self, recipe_ids, pool, neighbours, since):
+        """
+        Строки рецептов, чьи списки похожих мог изменить журнал:
+        сами изменённые рецепты, рецепты, в чьих списках они есть,
+        и рецепты, для которых изменённый рецепт ближе последнего
+        из их списка.
+        """
+        changed = RecipeChange.objects.changed_since(since)
+        if not changed:
+            return np.empty(0, dtype=np.int64)
+        listing = SimilarRecipe.objects.filter(
+            similar_id__in=changed
+        ).values_list('recipe_id', flat=True)
+        affected = np.isin(
+            recipe_ids, np.fromiter(set(listing) | changed, np.int64)
+        )
+        changed_rows = np.flatnonzero(np.isin(
+            recipe_ids, np.fromiter(changed, np.int64)
+        ))
+        if len(changed_rows):
+            best = np.zeros(len(recipe_ids), dtype=np.float32)
+            for scores in pool.map(similarity.best_scores, self.batches(
+                changed_rows, self.batch_size
+            )):
+                np.maximum(best, scores, out=best)
+            # Рецепт попадает в полный список, только если он ближе
+            # последнего в нём; в неполный — при любой близости.
+            lists = np.array(
+                SimilarRecipe.objects.order_by().values('recipe').annotate(
+                    lowest=Min('score'), count=Count('id')
+                ).filter(count__gte=neighbours).values_list(
+                    'recipe', 'lowest'),
+                dtype=np.float64,
+            ).reshape(-1, 2)
+            listed = lists[:, 0].astype(np.int64)
+            known = np.isin(listed, recipe_ids)
+            threshold = np.zeros(len(recipe_ids), dtype=np.float32)
+            threshold[np.searchsorted(recipe_ids, listed[known])] = (
+                lists[known, 1]
+            )
+            affected |= best > threshold
+        return np.flatnonzero(affected)
+
+    @staticmethod
+    def batches(rows, size):
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+
+    def save(self, built_at, recipe_ids, rows, results, full):
+        created = 0
+        with transaction.atomic():
+            if full:
+                SimilarRecipe.objects.all().delete()
+            else:
+                for batch in self.batches(rows, self.batch_size):
+                    SimilarRecipe.objects.filter(
+                        recipe_id__in=recipe_ids[batch].tolist()
+                    ).delete()
+            for result_rows, columns, scores, ranks in results:
+                SimilarRecipe.objects.bulk_create(
+                    SimilarRecipe(
+                        recipe_id=recipe_id,
+                        similar_id=similar_id,
+                        rank=rank,
+                        score=score,
+                        built_at=built_at,
+                    )
+                    for recipe_id, similar_id, score, rank in zip(
+                        recipe_ids[result_rows].tolist(),
+                        recipe_ids[columns].tolist(),
+                        scores.tolist(),
+                        ranks.tolist(),
+                    )
+                )
+                created += len(result_rows)
+            SimilarRecipesBuild.objects.create(
+                built_at=built_at, full=full, recipes=len(rows)
+            )
+            SimilarRecipesBuild.objects.filter(
+                built_at__lt=built_at - RECIPE_CHANGES_RETENTION
+            ).delete()
+        bump_version(SimilarRecipe)
+        return created
+
+    def handle(self, *args, **kwargs):
+        start = time.monotonic()
+        self.batch_size = kwargs['batch_size']
+        neighbours = kwargs['neighbours']
+        last_built = SimilarRecipesBuild.objects.values_list(
+            'built_at', flat=True).first()
+        # Время запуска берётся до чтения рецептов: всё, что изменится
+        # во время расчёта, перечитает следующий запуск.
+        built_at = timezone.now()
+        full = kwargs['full'] or last_built is None or (
+            built_at - last_built
+            > RECIPE_CHANGES_RETENTION - CHANGES_OVERLAP
+        )
+        recipe_ids, matrix, tag_column = self.load_matrix()
+        if not len(recipe_ids):
+            self.stdout.write('Рецептов нет')
+            return
+        with ProcessPoolExecutor(
+            max_workers=kwargs['workers'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=similarity.init_worker,
+            initargs=(matrix, tag_column, neighbours),
+        ) as pool:
+            if full:
+                rows = np.arange(len(recipe_ids))
+            else:
+                rows = self.affected_rows(
+                    recipe_ids, pool, neighbours,
+                    last_built - CHANGES_OVERLAP
+                )
+                if 2 * len(rows) > len(recipe_ids):
+                    full = True
+                    rows = np.arange(len(recipe_ids))
+            results = pool.map(
+                similarity.nearest, self.batches(rows, self.batch_size)
+            )
+            created = self.save(built_at, recipe_ids, rows, results, full)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Полный" if full else "Частичный"} пересчёт за '
+            f'{time.monotonic() - start:.1f} с: рецептов {len(rows)}, '
+            f'похожих {created}'
+        ))
@@ -0,0 +1,312 @@
+import json
+import shutil
+import tempfile
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from foodgram.middleware import QueryCollector
+from recipes.activity import flush_events
+from recipes.tests.factories import PASSWORD, build_fixture, recipe_payload
+
+# Размеры данных: строк на странице, ингредиентов и тегов в рецепте,
+# рецептов у автора и подписок пользователя.
+SIZES = (1, 3, 6)
+# Письма сброса пароля и имени не отправляются: для них в DJOSER
+# не заданы адреса подтверждения, поэтому ищется несуществующий адрес.
+UNKNOWN_EMAIL = 'nobody@example.com'
+# Эндпоинты, которые не относятся к API приложений.
+IGNORED_ROUTES = {'metrics'}
+METHODS = ('get', 'post', 'put', 'patch', 'delete')
+
+
+def api_routes(resolver=None, prefix='', seen=None):
+    """
+    Пары (имя маршрута, метод) всех эндпоинтов API.
+    Маршруты с суффиксом формата и маршруты, перекрытые
+    более ранними с тем же шаблоном, пропускаются.
+    """
+    resolver = resolver or get_resolver()
+    seen = set() if seen is None else seen
+    for pattern in resolver.url_patterns:
+        path = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if path.startswith('api/'):
+                yield from api_routes(pattern, path, seen)
+            continue
+        if not isinstance(pattern, URLPattern) or path in seen:
+            continue
+        seen.add(path)
+        if '(?P<format>' in path or pattern.name in IGNORED_ROUTES:
+            continue
+        callback = pattern.callback
+        actions = getattr(callback, 'actions', None)
+        if actions is None:
+            view_class = getattr(callback, 'view_class', None)
+            actions = {
+                method: method for method in METHODS
+                if hasattr(view_class, method)
+            }
+        for method in actions:
+            yield pattern.name, method.upper()
+
+
+def user_payload(user, suffix=''):
+    return {
+        'email': user.email,
+        'username': user.username + suffix,
+        'first_name': 'Имя',
+        'last_name': 'Фамилия',
+    }
+
+
+def reset_payload(**fields):
+    return dict(uid='MQ', token='invalid', **fields)
+
+
+# Сценарии выполняются по порядку на свежих данных каждого размера:
+# (название, маршрут, метод, клиент, функция ctx -> (путь, тело)).
+SCENARIOS = (
+    ('api root', 'api-root', 'GET', 'me', lambda ctx: ('/api/', None)),
+    ('users', 'users-list', 'GET', 'anon',
+     lambda ctx: (f'/api/users/?limit={ctx.size}', None)),
+    ('users, authorized', 'users-list', 'GET', 'me',
+     lambda ctx: (f'/api/users/?limit={ctx.size}', None)),
+    ('sign up', 'users-list', 'POST', 'anon', lambda ctx: (
+        '/api/users/', {
+            'email': 'new@example.com', 'username': 'new',
+            'first_name': 'Имя', 'last_name': 'Фамилия',
+            'password': PASSWORD,
+        })),
+    ('me', 'users-me', 'GET', 'me', lambda ctx: ('/api/users/me/', None)),
+    ('me, put', 'users-me', 'PUT', 'me',
+     lambda ctx: ('/api/users/me/', user_payload(ctx.me))),
+    ('me, patch', 'users-me', 'PATCH', 'me',
+     lambda ctx: ('/api/users/me/', {'first_name': 'Другое'})),
+    ('user', 'users-detail', 'GET', 'me',
+     lambda ctx: (f'/api/users/{ctx.author_ids[0]}/', None)),
+    ('user, put', 'users-detail', 'PUT', 'me',
+     lambda ctx: (f'/api/users/{ctx.me.id}/', user_payload(ctx.me))),
+    ('user, patch', 'users-detail', 'PATCH', 'me', lambda ctx: (
+        f'/api/users/{ctx.me.id}/', {'last_name': 'Другая'})),
+    ('set password', 'users-set-password', 'POST', 'me', lambda ctx: (
+        '/api/users/set_password/',
+        {'new_password': PASSWORD, 'current_password': PASSWORD})),
+    ('set username', 'users-set-username', 'POST', 'me', lambda ctx: (
+        '/api/users/set_username/',
+        {'new_username': 'renamed', 'current_password': PASSWORD})),
+    ('activation', 'users-activation', 'POST', 'anon',
+     lambda ctx: ('/api/users/activation/', reset_payload())),
+    ('resend activation', 'users-resend-activation', 'POST', 'anon',
+     lambda ctx: ('/api/users/resend_activation/',
+                  {'email': ctx.me.email})),
+    ('reset password', 'users-reset-password', 'POST', 'anon',
+     lambda ctx: ('/api/users/reset_password/', {'email': UNKNOWN_EMAIL})),
+    ('reset password confirm', 'users-reset-password-confirm', 'POST',
+     'anon', lambda ctx: (
+         '/api/users/reset_password_confirm/',
+         reset_payload(new_password=PASSWORD))),
+    ('reset username', 'users-reset-username', 'POST', 'anon',
+     lambda ctx: ('/api/users/reset_username/', {'email': UNKNOWN_EMAIL})),
+    ('reset username confirm', 'users-reset-username-confirm', 'POST',
+     'anon', lambda ctx: (
+         '/api/users/reset_username_confirm/',
+         reset_payload(new_username='other'))),
+    ('subscriptions', 'users-subscriptions', 'GET', 'me', lambda ctx: (
+        f'/api/users/subscriptions/?limit={ctx.size}', None)),
+    ('subscriptions, recipes_limit', 'users-subscriptions', 'GET', 'me',
+     lambda ctx: (
+         f'/api/users/subscriptions/?limit={ctx.size}'
+         f'&recipes_limit={ctx.size}', None)),
+    ('subscribe', 'users-subscribe', 'POST', 'me',
+     lambda ctx: (f'/api/users/{ctx.stranger.id}/subscribe/', None)),
+    ('unsubscribe', 'users-subscribe', 'DELETE', 'me',
+     lambda ctx: (f'/api/users/{ctx.stranger.id}/subscribe/', None)),
+    ('login', 'login', 'POST', 'anon', lambda ctx: (
+        '/api/auth/token/login/',
+        {'email': ctx.spares[2].email, 'password': PASSWORD})),
+    ('logout', 'logout', 'POST', 'spare2',
+     lambda ctx: ('/api/auth/token/logout/', None)),
+    ('tags', 'tags-list', 'GET', 'anon', lambda ctx: ('/api/tags/', None)),
+    ('tag', 'tags-detail', 'GET', 'anon',
+     lambda ctx: (f'/api/tags/{ctx.tag_ids[0]}/', None)),
+    ('ingredients', 'ingredients-list', 'GET', 'anon',
+     lambda ctx: ('/api/ingredients/?name=Ингр', None)),
+    ('ingredient', 'ingredients-detail', 'GET', 'anon',
+     lambda ctx: (f'/api/ingredients/{ctx.ingredient_ids[0]}/', None)),
+    ('recipes', 'recipes-list', 'GET', 'anon',
+     lambda ctx: (f'/api/recipes/?limit={ctx.size}', None)),
+    ('recipes, authorized', 'recipes-list', 'GET', 'me',
+     lambda ctx: (f'/api/recipes/?limit={ctx.size}', None)),
+    ('recipes, tags', 'recipes-list', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/?limit={ctx.size}&'
+        + '&'.join(f'tags={slug}' for slug in ctx.tag_slugs), None)),
+    ('recipes, author', 'recipes-list', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/?limit={ctx.size}&author={ctx.author_ids[0]}',
+        None)),
+    ('recipes, favorited', 'recipes-list', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/?limit={ctx.size}&is_favorited=1', None)),
+    ('recipes, in cart', 'recipes-list', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/?limit={ctx.size}&is_in_shopping_cart=1', None)),
+    ('recipes, cursor', 'recipes-list', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/?pagination=cursor&limit={ctx.size}', None)),
+    ('recipes, popular', 'recipes-list', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/?ordering=popular&limit={ctx.size}', None)),
+    ('recipes, cursor popular', 'recipes-list', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/?pagination=cursor&ordering=popular'
+        f'&limit={ctx.size}', None)),
+    ('recipes trending', 'recipes-trending', 'GET', 'me',
+     lambda ctx: (f'/api/recipes/trending/?limit={ctx.size}', None)),
+    ('recipe similar', 'recipes-similar', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/{ctx.recipe_ids[0]}/similar/', None)),
+    ('recipes pantry', 'recipes-pantry', 'GET', 'me', lambda ctx: (
+        f'/api/recipes/pantry/?limit={ctx.size}&'
+        + '&'.join(f'ingredients={ingredient_id}'
+                   for ingredient_id in ctx.ingredient_ids[:ctx.size]),
+        None)),
+    ('recipes count', 'recipes-count', 'GET', 'me',
+     lambda ctx: ('/api/recipes/count/', None)),
+    ('feed', 'recipes-feed', 'GET', 'me',
+     lambda ctx: (f'/api/recipes/feed/?limit={ctx.size}', None)),
+    ('shopping cart download', 'recipes-download-shopping-cart', 'GET',
+     'me', lambda ctx: ('/api/recipes/download_shopping_cart/', None)),
+    ('recipe', 'recipes-detail', 'GET', 'me',
+     lambda ctx: (f'/api/recipes/{ctx.recipe_ids[0]}/', None)),
+    ('recipe create', 'recipes-list', 'POST', 'me',
+     lambda ctx: ('/api/recipes/', recipe_payload(ctx))),
+    ('recipe put', 'recipes-detail', 'PUT', 'me', lambda ctx: (
+        f'/api/recipes/{ctx.my_recipe_ids[0]}/',
+        recipe_payload(ctx, ctx.size))),
+    ('recipe patch', 'recipes-detail', 'PATCH', 'me', lambda ctx: (
+        f'/api/recipes/{ctx.my_recipe_ids[0]}/', recipe_payload(ctx))),
+    ('favorite', 'recipes-favorite', 'POST', 'me', lambda ctx: (
+        f'/api/recipes/{ctx.stranger_recipe_ids[0]}/favorite/', None)),
+    ('unfavorite', 'recipes-favorite', 'DELETE', 'me', lambda ctx: (
+        f'/api/recipes/{ctx.stranger_recipe_ids[0]}/favorite/', None)),
+    ('add to cart', 'recipes-shopping-cart', 'POST', 'me', lambda ctx: (
+        f'/api/recipes/{ctx.stranger_recipe_ids[0]}/shopping_cart/', None)),
+    ('remove from cart', 'recipes-shopping-cart', 'DELETE', 'me',
+     lambda ctx: (
+         f'/api/recipes/{ctx.stranger_recipe_ids[0]}/shopping_cart/',
+         None)),
+    ('recipe delete', 'recipes-detail', 'DELETE', 'me',
+     lambda ctx: (f'/api/recipes/{ctx.my_recipe_ids[-1]}/', None)),
+    ('user delete', 'users-detail', 'DELETE', 'spare0', lambda ctx: (
+        f'/api/users/{ctx.spares[0].id}/', {'current_password': PASSWORD})),
+    ('me delete', 'users-me', 'DELETE', 'spare1', lambda ctx: (
+        '/api/users/me/', {'current_password': PASSWORD})),
+)
+
+
+def measure(client, method, path, data):
+    """Выполняет запрос и возвращает код ответа и собранные запросы."""
+    flush_events()
+    cache.clear()
+    collector = QueryCollector()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(collector))
+        response = client.generic(
+            method, path,
+            json.dumps(data) if data is not None else '',
+            content_type='application/json',
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return response.status_code, collector
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, что число запросов к базе на каждом эндпоинте API '
+        'не растёт вместе с размером данных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=SIZES,
+            help='Размеры данных, не меньше двух'
+        )
+
+    def check_coverage(self):
+        covered = {(route, method) for _, route, method, _, _ in SCENARIOS}
+        missing = sorted(set(api_routes()) - covered)
+        if missing:
+            raise CommandError(
+                'Нет сценариев для эндпоинтов: ' + ', '.join(
+                    f'{method} {route}' for route, method in missing)
+            )
+
+    def run_size(self, size):
+        call_command('flush', interactive=False, verbosity=0)
+        ctx = build_fixture(size)
+        results = {}
+        for name, _, method, client, build in SCENARIOS:
+            path, data = build(ctx)
+            results[name] = measure(ctx.clients[client], method, path, data)
+        # Остаток буфера пишется в тестовую базу, а не при выходе.
+        flush_events()
+        return results
+
+    def report(self, name, runs):
+        """Описание сценария, где число запросов зависит от размера."""
+        (small_size, (_, small)), (large_size, (_, large)) = (
+            runs[0], runs[-1]
+        )
+        lines = [
+            f'{name}: ' + ', '.join(
+                f'{size}: {collector.count}'
+                for size, (_, collector) in runs
+            )
+        ]
+        for sql, (count, _) in large.statements.items():
+            before = small.statements.get(sql, (0,))[0]
+            if count != before:
+                lines.append(
+                    f'    {before} -> {count} раз при размере '
+                    f'{small_size} -> {large_size}: {sql}'
+                )
+        return '\n'.join(lines)
+
+    def handle(self, *args, **kwargs):
+        sizes = sorted(set(kwargs['sizes']))
+        if len(sizes) < 2:
+            raise CommandError('Нужно хотя бы два разных размера данных')
+        self.check_coverage()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        directory = tempfile.mkdtemp()
+        try:
+            with override_settings(
+                MEDIA_ROOT=directory, VERSION_STAMPS_ROOT=directory
+            ):
+                runs = {size: self.run_size(size) for size in sizes}
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+        failures = []
+        for name, *_ in SCENARIOS:
+            results = [(size, runs[size][name]) for size in sizes]
+            counts = {collector.count for _, (_, collector) in results}
+            statuses = {status for _, (status, _) in results}
+            if len(counts) > 1 or max(statuses) >= 500:
+                failures.append(self.report(name, results))
+            self.stdout.write(
+                f'{name:32} статус {"/".join(map(str, sorted(statuses)))}'
+                f', запросов {"/".join(map(str, sorted(counts)))}'
+            )
+        if failures:
+            raise CommandError(
+                'Число запросов растёт с размером данных:\n'
+                + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Число запросов постоянно на размерах {sizes}'
+        ))
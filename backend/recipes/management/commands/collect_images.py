@@ -0,0 +1,61 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import Recipe
+
+IMAGES_DIR = 'recipes/images'
+
+
+def walk(storage, directory):
+    """Рекурсивно перечисляет файлы каталога хранилища."""
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for name in directories:
+        yield from walk(storage, os.path.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения рецептов и их копии, на которые '
+        'не ссылается ни один рецепт'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help='Не трогать файлы моложе указанного числа минут'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены'
+        )
+
+    def handle(self, *args, **kwargs):
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(IMAGES_DIR):
+            return
+        referenced = set()
+        for image, image_sizes in Recipe.objects.values_list(
+            'image', 'image_sizes'
+        ).iterator():
+            referenced.add(image)
+            referenced.update(image_sizes.values())
+        threshold = timezone.now() - timedelta(minutes=kwargs['min_age'])
+        deleted = 0
+        for name in walk(storage, IMAGES_DIR):
+            if name in referenced or (
+                storage.get_modified_time(name) > threshold
+            ):
+                continue
+            deleted += 1
+            if kwargs['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Неиспользуемых файлов: {deleted}'
+            + (' (не удалены)' if kwargs['dry_run'] else '')
+        ))
@@ -0,0 +1,293 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from PIL import Image
+from recipes.images import make_image_sizes
+from recipes.models import (FEED_BACKFILL_SIZE, FEED_FANOUT_LIMIT,
+                            POPULAR_AUTHORS_VERSION_KEY, AmountIngredient,
+                            Cart, Favorites, FeedItem, Ingredient, Recipe, Tag)
+from recipes.signals import VERSIONED_MODELS
+from recipes.versions import bump_version
+from users.models import Follow, User
+
+# Все сгенерированные пользователи получают этот префикс,
+# по нему же --flush удаляет прошлый набор данных.
+USERNAME_PREFIX = 'dataset_'
+PASSWORD = 'dataset-password'
+# Даты публикации отсчитываются от фиксированного момента,
+# чтобы набор данных не зависел от дня генерации.
+BASE_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+PUBLICATION_PERIOD = timedelta(days=365)
+DEFAULT_TAGS = (
+    ('Завтрак', 'E26C2D', 'breakfast'),
+    ('Обед', '49B64E', 'lunch'),
+    ('Ужин', '8775D2', 'dinner'),
+    ('Десерт', 'F5A623', 'dessert'),
+    ('Выпечка', 'B8860B', 'bakery'),
+    ('Напитки', '4A90E2', 'drinks'),
+)
+UNITS = ('г', 'мл', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+def zipf_weights(size, exponent=1.1):
+    """Накопленные веса распределения Ципфа для random.choices."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def sample_distinct(rng, population, cum_weights, count):
+    """Выбирает до count разных элементов с учётом весов."""
+    count = min(count, len(population))
+    chosen = set()
+    for _ in range(count * 4):
+        chosen.add(rng.choices(population, cum_weights=cum_weights)[0])
+        if len(chosen) == count:
+            break
+    return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует детерминированный набор данных заданного размера '
+        'для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Сколько ингредиентов создать, если справочник пуст'
+        )
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--favorites-per-user', type=int, default=30)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Удалить ранее сгенерированный набор данных'
+        )
+
+    def ensure_tags(self):
+        for name, color, slug in DEFAULT_TAGS:
+            if not Tag.objects.filter(
+                Q(name=name) | Q(color=color) | Q(slug=slug)
+            ).exists():
+                Tag.objects.create(name=name, color=color, slug=slug)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def ensure_ingredients(self, count):
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(
+                        name=f'Ингредиент {number}',
+                        measurement_unit=UNITS[number % len(UNITS)],
+                    )
+                    for number in range(count)
+                ),
+                batch_size=self.batch_size,
+            )
+        return list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+
+    def create_image(self):
+        """Сохраняет одно изображение-заглушку, общее для всех рецептов."""
+        buffer = BytesIO()
+        Image.new('RGB', (1280, 960), (226, 108, 45)).save(buffer, 'JPEG')
+        name = Recipe.image.field.storage.save(
+            'recipes/images/dataset.jpg', ContentFile(buffer.getvalue())
+        )
+        return name, make_image_sizes(Recipe(image=name).image)
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{USERNAME_PREFIX}{number}',
+                    email=f'{USERNAME_PREFIX}{number}@example.com',
+                    first_name='Имя',
+                    last_name=f'Фамилия {number}',
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(
+            User.objects.filter(
+                username__startswith=USERNAME_PREFIX
+            ).order_by('id').values_list('id', flat=True)
+        )
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids):
+        """
+        Рецепты распределены по авторам по закону Ципфа,
+        ингредиенты и теги — тоже: популярные встречаются чаще.
+        """
+        rng = self.rng
+        authors = zipf_weights(len(user_ids))
+        image, image_sizes = self.create_image()
+        author_ids = rng.choices(user_ids, cum_weights=authors, k=count)
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {number}',
+                    text='Описание рецепта. ' * rng.randint(3, 30),
+                    cooking_time=rng.randint(5, 180),
+                    image=image,
+                    image_sizes=image_sizes,
+                )
+                for number, author_id in enumerate(author_ids)
+            ),
+            batch_size=self.batch_size,
+        )
+        recipes = list(
+            Recipe.objects.filter(
+                author_id__in=user_ids
+            ).order_by('id').only('id', 'author_id')
+        )
+        for recipe in recipes:
+            recipe.pub_date = BASE_DATE - PUBLICATION_PERIOD * rng.random()
+        Recipe.objects.bulk_update(
+            recipes, ('pub_date',), batch_size=self.batch_size
+        )
+        ingredients = zipf_weights(len(ingredient_ids))
+        tags = zipf_weights(len(tag_ids), exponent=0.5)
+        AmountIngredient.objects.bulk_create(
+            (
+                AmountIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.choice((1, 2, 5, 10, 50, 100, 200, 500)),
+                )
+                for recipe in recipes
+                for ingredient_id in sample_distinct(
+                    rng, ingredient_ids, ingredients,
+                    max(2, min(20, round(rng.gauss(8, 3))))
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in sample_distinct(
+                    rng, tag_ids, tags, rng.randint(1, 3)
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+        Recipe.objects.filter(author_id__in=user_ids).update_tag_masks()
+        return recipes
+
+    def create_relations(self, model, target, user_ids, targets, per_user):
+        """Связи пользователей с популярными по Ципфу объектами."""
+        rng = self.rng
+        weights = zipf_weights(len(targets))
+        rows = []
+        for user_id in user_ids:
+            count = rng.randint(0, 2 * per_user)
+            for target_id in sample_distinct(rng, targets, weights, count):
+                if target_id != user_id or target != 'author_id':
+                    rows.append(model(user_id=user_id, **{target: target_id}))
+        model.objects.bulk_create(
+            rows, batch_size=self.batch_size, ignore_conflicts=True
+        )
+        return rows
+
+    def create_feed(self, follows, recipes):
+        """Заполняет ленты так же, как FeedItemQuerySet.backfill."""
+        by_author = {}
+        for recipe in sorted(recipes, key=lambda recipe: recipe.pub_date,
+                             reverse=True):
+            by_author.setdefault(recipe.author_id, []).append(recipe)
+        followers = {}
+        for follow in follows:
+            followers[follow.author_id] = followers.get(
+                follow.author_id, 0) + 1
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(
+                    user_id=follow.user_id,
+                    recipe_id=recipe.id,
+                    author_id=follow.author_id,
+                    pub_date=recipe.pub_date,
+                )
+                for follow in follows
+                if followers[follow.author_id] <= FEED_FANOUT_LIMIT
+                for recipe in by_author.get(
+                    follow.author_id, ())[:FEED_BACKFILL_SIZE]
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def flush(self):
+        with transaction.atomic():
+            Recipe.objects.filter(
+                author__username__startswith=USERNAME_PREFIX
+            ).delete()
+            User.objects.filter(
+                username__startswith=USERNAME_PREFIX
+            ).delete()
+
+    def handle(self, *args, **kwargs):
+        self.rng = random.Random(kwargs['seed'])
+        self.batch_size = kwargs['batch_size']
+        if kwargs['flush']:
+            self.flush()
+        elif User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).exists():
+            raise CommandError(
+                'Набор данных уже сгенерирован, используйте --flush'
+            )
+        start = time.monotonic()
+        with transaction.atomic():
+            tag_ids = self.ensure_tags()
+            ingredient_ids = self.ensure_ingredients(kwargs['ingredients'])
+            user_ids = self.create_users(kwargs['users'])
+            recipes = self.create_recipes(
+                kwargs['recipes'], user_ids, tag_ids, ingredient_ids
+            )
+            recipe_ids = [recipe.id for recipe in recipes]
+            follows = self.create_relations(
+                Follow, 'author_id', user_ids, user_ids,
+                kwargs['follows_per_user']
+            )
+            favorites = self.create_relations(
+                Favorites, 'recipe_id', user_ids, recipe_ids,
+                kwargs['favorites_per_user']
+            )
+            carts = self.create_relations(
+                Cart, 'recipe_id', user_ids, recipe_ids,
+                kwargs['carts_per_user']
+            )
+            self.create_feed(follows, recipes)
+            call_command('rebuild_shopping_lists', verbosity=0)
+            call_command('reconcile_recipe_counters', verbosity=0)
+        bump_version(Follow, POPULAR_AUTHORS_VERSION_KEY)
+        for model in VERSIONED_MODELS:
+            bump_version(model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.monotonic() - start:.1f} с: '
+            f'пользователей {len(user_ids)}, рецептов {len(recipes)}, '
+            f'подписок {len(follows)}, избранного {len(favorites)}, '
+            f'корзин {len(carts)}. Пароль пользователей: {PASSWORD}'
+        ))
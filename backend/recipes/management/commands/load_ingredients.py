@@ -1,38 +1,135 @@
+import csv
 import json
 import os
+import re
+import time
+from itertools import islice
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from foodgram.settings import DATA_ROOT
-from recipes.models import Ingredient, Tag
+from recipes.models import MAX_TAGS, Ingredient, Tag, free_tag_bits
+from recipes.versions import bump_version
+
+# Поля, которые читаются из файла, и поля, по которым ищутся дубли.
+MODELS = {
+    'tags': (Tag, ('name', 'color', 'slug'), ('slug',)),
+    'ingredients': (
+        Ingredient,
+        ('name', 'measurement_unit'),
+        ('name', 'measurement_unit'),
+    ),
+}
+CHUNK_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_json(file):
+    """Построчно разбирает JSON-массив объектов, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив')
+    position = 1
+    chunk = buffer
+    while chunk:
+        chunk = file.read(CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            position = SEPARATORS.match(buffer, position).end()
+            if buffer.startswith(']', position):
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item
+
+
+def read_csv(file, fields):
+    """Построчно читает CSV без заголовка с колонками fields."""
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, row))
 
 
 class Command(BaseCommand):
-    help = 'Загружает данные об ингредиентах в бд'
+    help = 'Загружает данные об ингредиентах или тегах в бд из JSON или CSV'
 
     def add_arguments(self, parser):
         parser.add_argument('filename', type=str)
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT'
+        )
+
+    def load(self, file, extension, model, fields, unique_fields, batch_size):
+        """
+        Пачками вставляет новые строки, пропуская дубли в файле
+        и уже существующие в базе записи.
+        Возвращает количество прочитанных строк.
+        """
+        if extension == 'csv':
+            rows = read_csv(file, fields)
+        else:
+            rows = read_json(file)
+        seen = set()
+        read = 0
+        # bulk_create не вызывает сигналы, биты новым тегам выдаются здесь.
+        # Тегов мало, поэтому уже загруженные пропускаются заранее,
+        # чтобы повторная загрузка файла не тратила свободные биты.
+        bits = None
+        if model is Tag:
+            bits = free_tag_bits()
+            seen.update(model.objects.values_list(*unique_fields))
+
+        def new_objects():
+            nonlocal read
+            for row in rows:
+                read += 1
+                values = {field: row.get(field) for field in fields}
+                key = tuple(values[field] for field in unique_fields)
+                if key not in seen:
+                    seen.add(key)
+                    if bits is not None:
+                        values['bit'] = next(bits, None)
+                        if values['bit'] is None:
+                            raise CommandError(
+                                f'Тегов не может быть больше {MAX_TAGS}'
+                            )
+                    yield model(**values)
+
+        objects = new_objects()
+        with transaction.atomic():
+            while True:
+                batch = list(islice(objects, batch_size))
+                if not batch:
+                    break
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+        return read
 
     def handle(self, *args, **kwargs):
         filename = kwargs['filename']
+        name, _, extension = filename.rpartition('.')
+        if name not in MODELS or extension not in ('json', 'csv'):
+            raise CommandError(
+                'Поддерживаются файлы tags и ingredients в форматах '
+                'json и csv!'
+            )
+        model, fields, unique_fields = MODELS[name]
         try:
+            start = time.monotonic()
             with open(
                 os.path.join(DATA_ROOT, filename), encoding='utf-8'
             ) as file:
-                data = json.load(file)
-
-            if filename.split('.')[0] == 'tags':
-                for item in data:
-                    Tag.objects.get_or_create(
-                        name=item.get('name'),
-                        color=item.get('color'),
-                        slug=item.get('slug')
-                    )
-            if filename.split('.')[0] == 'ingredients':
-                for item in data:
-                    Ingredient.objects.get_or_create(
-                        name=item.get('name'),
-                        measurement_unit=item.get('measurement_unit')
-                    )
+                read = self.load(
+                    file, extension, model, fields, unique_fields,
+                    kwargs['batch_size']
+                )
+            elapsed = time.monotonic() - start
         except FileNotFoundError:
             raise CommandError(
                 f'Файл {filename} отсутствует в каталоге data!'
@@ -45,7 +142,14 @@ class Command(BaseCommand):
             raise CommandError(
                 f'Для открытия файла {filename} недостаточно прав!'
             )
+        except CommandError:
+            raise
         except Exception:
             raise CommandError(
                 f'Ошибка при открытии файла {filename}'
             )
+        bump_version(model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {read} за {elapsed:.2f} с '
+            f'({read / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии изображений существующих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии и у рецептов, где они уже есть'
+        )
+
+    def handle(self, *args, **kwargs):
+        recipes = Recipe.objects.exclude(image='').only('image', 'image_sizes')
+        if not kwargs['all']:
+            recipes = recipes.filter(image_sizes={})
+        done = failed = 0
+        for recipe in recipes.iterator():
+            try:
+                recipe.update_image_sizes()
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(
+                    f'Рецепт {recipe.pk}: не удалось обработать '
+                    f'{recipe.image.name}: {error}'
+                )
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {done}, с ошибками: {failed}'
+        ))
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from recipes.models import RecipeActivity, TrendingRecipe, activity_bucket
+from recipes.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг популярных рецептов по почасовым '
+        'счётчикам и удаляет счётчики, вышедшие за окно'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-hours', type=int, default=7 * 24,
+            help='За сколько последних часов учитываются события'
+        )
+        parser.add_argument(
+            '--half-life-hours', type=float, default=24,
+            help='За сколько часов вклад события уменьшается вдвое'
+        )
+        parser.add_argument(
+            '--size', type=int, default=100,
+            help='Сколько рецептов попадает в рейтинг'
+        )
+
+    def handle(self, *args, **kwargs):
+        now = timezone.now()
+        window = kwargs['window_hours']
+        scores = RecipeActivity.objects.scores(
+            now, window, kwargs['half_life_hours']
+        ).filter(score__gt=0)[:kwargs['size']]
+        with transaction.atomic():
+            TrendingRecipe.objects.all().delete()
+            trending = TrendingRecipe.objects.bulk_create(
+                TrendingRecipe(
+                    recipe_id=row['recipe'], rank=rank, score=row['score']
+                )
+                for rank, row in enumerate(scores, start=1)
+            )
+        bump_version(TrendingRecipe)
+        deleted, _ = RecipeActivity.objects.filter(
+            bucket__lte=activity_bucket(now) - timedelta(hours=window)
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'В рейтинге рецептов: {len(trending)}, '
+            f'удалено устаревших счётчиков: {deleted}'
+        ))
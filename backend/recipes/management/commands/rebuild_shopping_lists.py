@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает таблицу списков покупок по корзинам пользователей '
+        'и сверяет её со свежей агрегацией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить таблицу, не пересобирая её'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        if not kwargs['check']:
+            with transaction.atomic():
+                ShoppingListItem.objects.all().delete()
+                ShoppingListItem.objects.bulk_create(
+                    (
+                        ShoppingListItem(
+                            user_id=row['user'],
+                            ingredient_id=row['ingredient'],
+                            total_amount=row['total_amount'],
+                        )
+                        for row in ShoppingListItem.objects
+                        .aggregate_from_carts().iterator()
+                    ),
+                    batch_size=kwargs['batch_size'],
+                )
+        expected = {
+            (row['user'], row['ingredient']): row['total_amount']
+            for row in ShoppingListItem.objects.aggregate_from_carts()
+        }
+        stored = {
+            (user, ingredient): total_amount
+            for user, ingredient, total_amount
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount')
+        }
+        mismatches = [
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}, '
+                f'например (user, ingredient): {sorted(mismatches)[:10]}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок согласованы, строк: {len(stored)}'
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from recipes.models import RECIPE_COUNTERS, Recipe, counted_relations
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики favorites_count и in_carts_count рецептов '
+        'с избранным и корзинами и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить счётчики, не исправляя их'
+        )
+
+    def handle(self, *args, **kwargs):
+        expected = {
+            f'expected_{field}': counted_relations(model)
+            for model, field in RECIPE_COUNTERS.items()
+        }
+        mismatches = Q()
+        for field in RECIPE_COUNTERS.values():
+            mismatches |= ~Q(**{field: F(f'expected_{field}')})
+        broken = Recipe.objects.annotate(**expected).filter(mismatches)
+        if kwargs['check']:
+            examples = list(broken.values_list('id', flat=True)[:10])
+            if examples:
+                raise CommandError(
+                    f'Расхождений в счётчиках рецептов: {broken.count()}, '
+                    f'например у рецептов {examples}'
+                )
+            self.stdout.write(self.style.SUCCESS('Счётчики согласованы'))
+            return
+        updated = Recipe.objects.filter(
+            pk__in=broken.values('pk')
+        ).update(**{
+            field: counted_relations(model)
+            for model, field in RECIPE_COUNTERS.items()
+        })
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {updated}'
+        ))
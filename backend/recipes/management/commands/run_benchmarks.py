@@ -0,0 +1,299 @@
+import json
+import os
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from functools import partial
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from foodgram.middleware import QueryCounter
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+PIXEL = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+def percentile(values, fraction):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, round(fraction * len(ordered) + 0.5) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class InProcessClient:
+    """Запросы через тестовый клиент Django с подсчётом запросов к базе."""
+
+    def __init__(self, token):
+        host = settings.ALLOWED_HOSTS[0].lstrip('.*') or 'localhost'
+        self.client = Client(
+            HTTP_HOST=host, HTTP_AUTHORIZATION=f'Token {token}'
+        )
+
+    def request(self, method, path, data=None):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.client.generic(
+                method, path,
+                json.dumps(data) if data is not None else '',
+                content_type='application/json',
+            )
+            body = b''.join(response) if response.streaming else (
+                response.content
+            )
+        return response.status_code, body, counter.count
+
+
+class HttpClient:
+    """
+    Запросы к запущенному серверу, например локальному gunicorn.
+    Число запросов к базе берётся из заголовка X-DB-Queries,
+    если на сервере включено QUERY_INSTRUMENTATION.
+    """
+
+    def __init__(self, token, base_url):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, data=None):
+        request = Request(
+            self.base_url + path,
+            data=json.dumps(data).encode() if data is not None else None,
+            method=method,
+            headers={
+                'Authorization': f'Token {self.token}',
+                'Content-Type': 'application/json',
+            },
+        )
+        try:
+            with urlopen(request) as response:
+                status, body = response.status, response.read()
+                queries = response.headers.get('X-DB-Queries')
+        except HTTPError as error:
+            status, body = error.code, error.read()
+            queries = error.headers.get('X-DB-Queries')
+        return status, body, int(queries) if queries else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, пропускную способность и число запросов '
+        'к базе на основных эндпоинтах API'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--base-url',
+            help='Адрес запущенного сервера; по умолчанию запросы '
+                 'выполняются в процессе через тестовый клиент'
+        )
+        parser.add_argument(
+            '--user',
+            help='Пользователь, от имени которого идут запросы; '
+                 'по умолчанию пользователь с наибольшим числом подписок'
+        )
+        parser.add_argument('--only', nargs='*', help='Названия сценариев')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument(
+            '--compare', help='JSON с прошлыми результатами для сравнения'
+        )
+
+    @staticmethod
+    def check_dataset():
+        """Сценариям нужны пользователи, теги, ингредиенты и рецепты."""
+        missing = [
+            str(model._meta.verbose_name_plural)
+            for model in (User, Tag, Ingredient, Recipe)
+            if not model.objects.exists()
+        ]
+        if missing:
+            raise CommandError(
+                f'В базе нет данных ({", ".join(missing)}), '
+                'сначала выполните generate_dataset'
+            )
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+        return User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows', 'id').first()
+
+    def get_scenarios(self):
+        """Сценарии: название, метод и функция, возвращающая путь и тело."""
+        tag = Tag.objects.order_by('id').values_list('slug', flat=True)[0]
+        recipe_ids = list(
+            Recipe.objects.order_by('-pub_date').values_list(
+                'id', flat=True)[:100]
+        )
+        tag_id = Tag.objects.order_by('id').values_list('id', flat=True)[0]
+        ingredient_id, ingredient_name = Ingredient.objects.order_by(
+            'id').values_list('id', 'name')[0]
+        created = []
+
+        def recipe_payload(number):
+            return {
+                'name': f'Бенчмарк {number}',
+                'text': 'Рецепт для замера производительности',
+                'cooking_time': 10,
+                'image': PIXEL,
+                'tags': [tag_id],
+                'ingredients': [{'id': ingredient_id, 'amount': number + 1}],
+            }
+
+        def create(number):
+            return '/api/recipes/', recipe_payload(number)
+
+        def update(number):
+            recipe_id = created[number % len(created)]
+            return f'/api/recipes/{recipe_id}/', recipe_payload(number)
+
+        return created, (
+            ('recipe_list', 'GET', lambda number: (
+                '/api/recipes/?page=1&limit=6', None)),
+            ('recipe_list_filtered', 'GET', lambda number: (
+                f'/api/recipes/?limit=6&tags={tag}&is_favorited=1', None)),
+            ('recipe_detail', 'GET', lambda number: (
+                f'/api/recipes/{recipe_ids[number % len(recipe_ids)]}/',
+                None)),
+            ('ingredient_search', 'GET', lambda number: (
+                '/api/ingredients/?' + urlencode(
+                    {'name': ingredient_name[:3]}), None)),
+            ('subscriptions', 'GET', lambda number: (
+                '/api/users/subscriptions/?recipes_limit=3', None)),
+            ('download_shopping_cart', 'GET', lambda number: (
+                '/api/recipes/download_shopping_cart/', None)),
+            ('recipe_create', 'POST', create),
+            ('recipe_update', 'PATCH', update),
+        )
+
+    def run_scenario(self, client, method, build, requests, warmup,
+                     on_response):
+        latencies, queries, errors = [], [], 0
+        for number in range(warmup):
+            on_response(*client.request(method, *build(number))[:2])
+        started = time.perf_counter()
+        for number in range(warmup, warmup + requests):
+            path, data = build(number)
+            start = time.perf_counter()
+            status, body, count = client.request(method, path, data)
+            latencies.append((time.perf_counter() - start) * 1000)
+            on_response(status, body)
+            if status >= 400:
+                errors += 1
+            if count is not None:
+                queries.append(count)
+        elapsed = time.perf_counter() - started
+        return {
+            'requests': requests,
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'throughput_rps': round(requests / elapsed, 1),
+            'queries_per_request': (
+                round(sum(queries) / len(queries), 2) if queries else None
+            ),
+        }
+
+    def handle(self, *args, **kwargs):
+        if kwargs['requests'] < 1 or kwargs['warmup'] < 0:
+            raise CommandError(
+                '--requests должно быть больше нуля, --warmup — не меньше'
+            )
+        self.check_dataset()
+        user = self.get_user(kwargs['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        if kwargs['base_url']:
+            client = HttpClient(token.key, kwargs['base_url'])
+        else:
+            client = InProcessClient(token.key)
+        created, scenarios = self.get_scenarios()
+
+        def remember_created(method, status, body):
+            if method == 'POST' and status == 201:
+                created.append(json.loads(body)['id'])
+
+        results = {}
+        try:
+            for name, method, build in scenarios:
+                if kwargs['only'] and name not in kwargs['only']:
+                    continue
+                if method == 'PATCH' and not created:
+                    self.stderr.write(f'{name}: нет созданных рецептов')
+                    continue
+                results[name] = self.run_scenario(
+                    client, method, build, kwargs['requests'],
+                    kwargs['warmup'], partial(remember_created, method)
+                )
+                self.stdout.write(f'{name:24} ' + ' '.join(
+                    f'{key}={value}' for key, value in results[name].items()
+                ))
+        finally:
+            for recipe_id in created:
+                client.request('DELETE', f'/api/recipes/{recipe_id}/')
+        self.save(results, kwargs)
+
+    def save(self, results, kwargs):
+        report = {
+            'revision': git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'base_url': kwargs['base_url'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'results': results,
+        }
+        output = kwargs['output'] or os.path.join(
+            'benchmarks', f'{report["revision"] or "results"}.json'
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f'Результаты сохранены в {output}')
+        )
+        if kwargs['compare']:
+            self.compare(results, kwargs['compare'])
+
+    def compare(self, results, filename):
+        with open(filename, encoding='utf-8') as file:
+            previous = json.load(file)['results']
+        for name, result in results.items():
+            before = previous.get(name)
+            if not before:
+                continue
+            self.stdout.write(f'{name:24} ' + ' '.join(
+                f'{key}: {before[key]} -> {result[key]}'
+                for key in ('p95_ms', 'throughput_rps', 'queries_per_request')
+            ))
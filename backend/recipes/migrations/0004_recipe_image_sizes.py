@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_auto_20261018_2136'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_sizes',
+            field=models.JSONField(blank=True, default=dict, help_text='Уменьшенные копии изображения: {размер: файл}', verbose_name='Размеры изображения'),
+        ),
+    ]
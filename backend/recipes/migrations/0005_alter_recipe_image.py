@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:40
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_image_sizes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(help_text='Изображение ингредиента', storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Изображение'),
+        ),
+    ]
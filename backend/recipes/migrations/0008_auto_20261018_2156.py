@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:56
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    counters = {
+        'favorites_count': apps.get_model('recipes', 'Favorites'),
+        'in_carts_count': apps.get_model('recipes', 'Cart'),
+    }
+    Recipe.objects.update(**{
+        field: Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).values(
+                'recipe'
+            ).annotate(total=Count('id')).values('total'),
+            output_field=IntegerField(),
+        ), 0)
+        for field, model in counters.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_auto_20261018_2145'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Сколько пользователей добавили рецепт в избранное', verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.IntegerField(default=0, editable=False, help_text='У скольких пользователей рецепт в корзине', verbose_name='В корзинах'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
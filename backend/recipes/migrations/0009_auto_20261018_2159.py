@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_auto_20261018_2156'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingRecipe',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('rank', models.PositiveIntegerField(db_index=True, verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+            ],
+            options={
+                'verbose_name': 'Популярный рецепт',
+                'verbose_name_plural': 'Популярные рецепты',
+                'ordering': ('rank',),
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='Час')),
+                ('favorites', models.IntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('carts', models.IntegerField(default=0, verbose_name='Добавлений в корзину')),
+                ('views', models.IntegerField(default=0, verbose_name='Просмотров')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Активность по рецепту',
+                'verbose_name_plural': 'Активность по рецептам',
+                'ordering': ('-bucket',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipeactivity',
+            index=models.Index(fields=['bucket'], name='activity_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeactivity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'bucket'), name='unique_recipe_activity'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:10
+
+from django.db import migrations, models
+from django.db.models import (BigIntegerField, ExpressionWrapper, F,
+                              OuterRef, Subquery, Sum, Value)
+from django.db.models.functions import Cast, Coalesce
+
+
+def fill_tag_masks(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for bit, tag in enumerate(Tag.objects.order_by('id')):
+        tag.bit = bit
+        tag.save(update_fields=('bit',))
+    Recipe.objects.update(tag_mask=Coalesce(Subquery(
+        Recipe.tags.through.objects.filter(recipe=OuterRef('pk')).values(
+            'recipe'
+        ).annotate(mask=Sum(ExpressionWrapper(
+            Cast(Value(1), BigIntegerField()).bitleftshift(F('tag__bit')),
+            output_field=BigIntegerField(),
+        ))).values('mask'),
+        output_field=BigIntegerField(),
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_auto_20261018_2159'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, help_text='Номер бита тега в Recipe.tag_mask', null=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Сумма Tag.mask тегов рецепта', verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, help_text='Номер бита тега в Recipe.tag_mask', unique=True, verbose_name='Бит в маске тегов'),
+        ),
+    ]
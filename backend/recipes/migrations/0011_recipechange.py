@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_auto_20261018_2210'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.IntegerField(verbose_name='Рецепт')),
+                ('changed_at', models.DateTimeField(db_index=True, verbose_name='Изменён')),
+            ],
+            options={
+                'verbose_name': 'Изменение рецепта',
+                'verbose_name_plural': 'Журнал изменений рецептов',
+                'ordering': ('-changed_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:48
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def record_last_build(apps, schema_editor):
+    SimilarRecipe = apps.get_model('recipes', 'SimilarRecipe')
+    SimilarRecipesBuild = apps.get_model('recipes', 'SimilarRecipesBuild')
+    last = SimilarRecipe.objects.aggregate(
+        built_at=Max('built_at'), recipes=Count('recipe', distinct=True)
+    )
+    if last['built_at'] is not None:
+        SimilarRecipesBuild.objects.create(full=True, **last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_auto_20261018_2215'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipesBuild',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('built_at', models.DateTimeField(db_index=True, verbose_name='Начат')),
+                ('full', models.BooleanField(verbose_name='Полный пересчёт')),
+                ('recipes', models.PositiveIntegerField(verbose_name='Пересчитано рецептов')),
+            ],
+            options={
+                'verbose_name': 'Расчёт похожих рецептов',
+                'verbose_name_plural': 'Расчёты похожих рецептов',
+                'ordering': ('-built_at',),
+            },
+        ),
+        migrations.RunPython(record_last_build, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
+from recipes.versions import get_version
+
+
+class ConditionalGetMixin:
+    """
+    Отдаёт ETag и Cache-Control для чтения и 304 Not Modified,
+    если данные не менялись. ETag считается по версиям моделей
+    etag_models, адресу запроса и заголовку Authorization
+    ещё до аутентификации и любых запросов к базе.
+    """
+    etag_models = ()
+    etag_actions = ('list', 'retrieve')
+    cache_max_age = 0
+
+    def get_etag_models(self, request, action):
+        """Модели, от версий которых зависит ответ на запрос."""
+        return self.etag_models
+
+    def get_etag(self, request, action):
+        parts = [
+            get_version(model)
+            for model in self.get_etag_models(request, action)
+        ]
+        parts.append(request.get_full_path())
+        parts.append(request.META.get('HTTP_AUTHORIZATION', ''))
+        parts.append(request.META.get('HTTP_ACCEPT', ''))
+        return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        if request.method not in ('GET', 'HEAD') or (
+            action not in self.etag_actions
+        ):
+            return super().dispatch(request, *args, **kwargs)
+        etag = self.get_etag(request, action)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response['ETag'] = etag
+        if 'HTTP_AUTHORIZATION' in request.META:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=self.cache_max_age
+            )
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -1,6 +1,19 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
-from django.db import models
-from users.models import User
+from django.db import models, transaction
+from django.db.models import (BigIntegerField, BooleanField, Case, Count,
+                              Exists, ExpressionWrapper, F, OuterRef, Prefetch,
+                              Q, Subquery, Sum, Value, When, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, RowNumber
+from django.utils import timezone
+from django_cleanup import cleanup
+from recipes.images import make_image_sizes
+from recipes.storage import ContentAddressedStorage
+from recipes.versions import bump_version, get_version
+from users.models import Follow, User
 
 
 class Ingredient(models.Model):
@@ -30,6 +43,10 @@ class Ingredient(models.Model):
         return self.name
 
 
+# Столько тегов помещается в знаковое 64-битное поле Recipe.tag_mask.
+MAX_TAGS = 63
+
+
 class Tag(models.Model):
     """
     Тэги для рецептов.
@@ -55,6 +72,12 @@ class Tag(models.Model):
         db_index=True,
         help_text='Адрес для странице в браузере'
     )
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов',
+        unique=True,
+        editable=False,
+        help_text='Номер бита тега в Recipe.tag_mask'
+    )
 
     class Meta:
         ordering = ('name',)
@@ -64,7 +87,156 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+
+def free_tag_bits():
+    """Свободные номера битов для новых тегов по возрастанию."""
+    taken = set(Tag.objects.values_list('bit', flat=True))
+    return iter([bit for bit in range(MAX_TAGS) if bit not in taken])
+
+
+# Порядок рецептов при ordering=popular.
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Queryset рецептов с флагами текущего пользователя."""
+
+    # Бюджет запросов на страницу списка рецептов при любом её размере:
+    # токен, COUNT, страница, теги, ингредиенты и запас на один запрос.
+    READ_QUERY_BUDGET = 6
+
+    @staticmethod
+    def read_prefetches():
+        """Теги и ингредиенты рецепта, нужные RecipeSerializer."""
+        return (
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'amount_ingredient',
+                queryset=AmountIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def for_read(self):
+        """
+        Подгружает всё, что нужно RecipeSerializer для чтения:
+        автора через JOIN, теги и ингредиенты рецепта двумя запросами
+        на всю страницу.
+        """
+        return self.select_related('author').prefetch_related(
+            *self.read_prefetches()
+        )
+
+    def feed(self, user):
+        """
+        Рецепты авторов, на которых подписан пользователь.
+        Обычно лента читается из FeedItem через JOIN в порядке индекса
+        (user, -pub_date), если queryset не отсортирован иначе.
+        Рецепты популярных авторов в FeedItem не раскладываются,
+        поэтому для подписчиков таких авторов к ленте добавляются
+        их рецепты напрямую.
+        """
+        popular_author_ids = get_popular_author_ids()
+        followed_popular = popular_author_ids and list(
+            Follow.objects.filter(
+                user=user, author_id__in=popular_author_ids
+            ).values_list('author_id', flat=True)
+        )
+        if followed_popular:
+            return self.filter(
+                Q(pk__in=FeedItem.objects.filter(user=user).values(
+                    'recipe_id'))
+                | Q(author_id__in=followed_popular)
+            )
+        queryset = self.filter(feed_items__user=user)
+        if not self.query.order_by:
+            queryset = queryset.order_by('-feed_items__pub_date', '-id')
+        return queryset
+
+    def latest_by_author(self, author_ids, limit):
+        """
+        Не больше limit последних рецептов каждого из авторов
+        author_ids одним запросом: рецепты нумеруются внутри автора
+        оконной функцией ROW_NUMBER(), а не коррелированным
+        подзапросом с LIMIT на каждую строку.
+        """
+        ranked = Recipe.objects.filter(author_id__in=author_ids).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).order_by().values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(author_id__in=author_ids, pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit),
+        ))
+
+    def popular(self):
+        """Самые популярные рецепты: больше всего раз в избранном."""
+        return self.order_by(*POPULAR_ORDERING)
+
+    def with_tags(self, mask, match_all=False):
+        """
+        Рецепты хотя бы с одним из тегов битовой маски mask,
+        а при match_all — со всеми её тегами. Одно условие на tag_mask
+        вместо JOIN с таблицей тегов и DISTINCT.
+        """
+        queryset = self.alias(tag_bits=F('tag_mask').bitand(mask))
+        if match_all:
+            return queryset.filter(tag_bits=mask)
+        return queryset.exclude(tag_bits=0)
+
+    def update_tag_masks(self):
+        """Пересчитывает tag_mask рецептов по их тегам одним UPDATE."""
+        masks = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(
+            mask=Sum(ExpressionWrapper(
+                Cast(Value(1), BigIntegerField()).bitleftshift(
+                    F('tag__bit')),
+                output_field=BigIntegerField(),
+            ))
+        ).values('mask')
+        return self.update(tag_mask=Coalesce(
+            Subquery(masks, output_field=BigIntegerField()), 0
+        ))
+
+    def change_counter(self, field, delta):
+        """Атомарно меняет счётчик favorites_count или in_carts_count."""
+        return self.update(**{field: F(field) + delta})
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты флагами is_favorited, is_in_shopping_cart
+        и is_subscribed (подписка на автора) через подзапросы Exists,
+        чтобы сериализатор не делал запросов на каждый рецепт.
+        """
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorites.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
 
+
+@cleanup.ignore
 class Recipe(models.Model):
     """
     Модель для рецептов.
@@ -87,8 +259,15 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Изображение',
         upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
         help_text='Изображение ингредиента'
     )
+    image_sizes = models.JSONField(
+        'Размеры изображения',
+        default=dict,
+        blank=True,
+        help_text='Уменьшенные копии изображения: {размер: файл}'
+    )
     text = models.TextField('Описание', help_text='Описание рецепта')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -114,15 +293,58 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    favorites_count = models.IntegerField(
+        'В избранном', default=0, editable=False,
+        help_text='Сколько пользователей добавили рецепт в избранное'
+    )
+    in_carts_count = models.IntegerField(
+        'В корзинах', default=0, editable=False,
+        help_text='У скольких пользователей рецепт в корзине'
+    )
+    tag_mask = models.BigIntegerField(
+        'Маска тегов', default=0, editable=False,
+        help_text='Сумма Tag.mask тегов рецепта'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=POPULAR_ORDERING,
+                name='recipe_popular_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    def get_image_url(self, size):
+        """
+        Возвращает адрес копии изображения нужного размера,
+        а если копий ещё нет — адрес оригинала.
+        """
+        name = self.image_sizes.get(size)
+        if name:
+            return self.image.storage.url(name)
+        return self.image.url if self.image else None
+
+    def update_image_sizes(self):
+        """
+        Пересоздаёт уменьшенные копии изображения рецепта.
+        Старые копии могут быть общими с другими рецептами
+        и удаляются командой collect_images.
+        """
+        self.image_sizes = make_image_sizes(self.image)
+        Recipe.objects.filter(pk=self.pk).update(image_sizes=self.image_sizes)
+
 
 class AmountIngredient(models.Model):
     """
@@ -218,3 +440,542 @@ class Favorites(models.Model):
                 name='unique_for_favorite'
             ),
         )
+
+
+# Счётчики рецепта, которые меняются вместе с избранным и корзинами.
+RECIPE_COUNTERS = {
+    Favorites: 'favorites_count',
+    Cart: 'in_carts_count',
+}
+
+
+def counted_relations(model):
+    """Количество строк model (Favorites или Cart) для каждого рецепта."""
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).values(
+            'recipe'
+        ).annotate(total=Count('id')).values('total'),
+        output_field=models.IntegerField(),
+    ), 0)
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """Поддержка агрегированного списка покупок в актуальном состоянии."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """
+        Прибавляет к total_amount изменения количества ингредиентов
+        ({ingredient_id: delta}) для всех пользователей из user_ids.
+        Недостающие строки создаются, обнулившиеся удаляются.
+        Вызывается внутри транзакции изменения корзины или рецепта.
+        """
+        deltas = {key: value for key, value in deltas.items() if value}
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id in deltas
+            ),
+            ignore_conflicts=True,
+        )
+        items = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        items.update(total_amount=F('total_amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()),
+            output_field=models.IntegerField(),
+        ))
+        items.filter(total_amount__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        """Добавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта."""
+        amounts = AmountIngredient.objects.filter(recipe_id=recipe_id)
+        self.apply_deltas((user_id,), {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in amounts.values_list(
+                'ingredient_id', 'amount')
+        })
+
+    def change_recipe(self, recipe_id, old_amounts, new_amounts):
+        """
+        Переносит изменения ингредиентов рецепта в списки покупок
+        всех пользователей, у которых рецепт лежит в корзине.
+        """
+        self.apply_deltas(
+            Cart.objects.filter(recipe_id=recipe_id).values_list(
+                'user_id', flat=True),
+            {
+                ingredient_id: (new_amounts.get(ingredient_id, 0)
+                                - old_amounts.get(ingredient_id, 0))
+                for ingredient_id in {*old_amounts, *new_amounts}
+            },
+        )
+
+    def aggregate_from_carts(self):
+        """Считает список покупок заново по корзинам и рецептам."""
+        return AmountIngredient.objects.filter(
+            recipe__cart__isnull=False
+        ).values(
+            'ingredient', user=F('recipe__cart__user')
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by()
+
+
+class ShoppingListItem(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается сигналами корзины и ингредиентов рецептов,
+    пересобирается командой rebuild_shopping_lists.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.IntegerField('Количество', default=0)
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('user', 'ingredient')
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+
+# Авторы, у которых подписчиков больше, не раскладывают новые рецепты
+# в ленты подписчиков: их рецепты подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = 1000
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_BACKFILL_SIZE = 100
+POPULAR_AUTHORS_CACHE_KEY = 'feed:popular_authors'
+POPULAR_AUTHORS_CACHE_TIMEOUT = 300
+# Версия набора популярных авторов хранится меткой подписок с этим
+# ключом: её смена сбрасывает кэш набора у всех воркеров.
+POPULAR_AUTHORS_VERSION_KEY = 'popular_authors'
+
+
+def is_popular_author(author_id):
+    """
+    Точно проверяет, больше ли у автора FEED_FANOUT_LIMIT подписчиков,
+    прочитав не больше FEED_FANOUT_LIMIT + 1 строк подписок.
+    """
+    return Follow.objects.filter(author_id=author_id).order_by()[
+        FEED_FANOUT_LIMIT:
+    ].exists()
+
+
+def popular_authors_changed():
+    """
+    После коммита меняет версию набора популярных авторов, чтобы
+    воркеры пересчитали его по новым подпискам.
+    """
+    transaction.on_commit(
+        lambda: bump_version(Follow, POPULAR_AUTHORS_VERSION_KEY)
+    )
+
+
+def get_popular_author_ids():
+    """
+    Id авторов, у которых подписчиков больше FEED_FANOUT_LIMIT.
+    Список кэшируется по версии набора и нужен только для чтения
+    лент; решения о раскладке рецептов принимает is_popular_author.
+    """
+    key = '{}:{}'.format(
+        POPULAR_AUTHORS_CACHE_KEY,
+        get_version(Follow, POPULAR_AUTHORS_VERSION_KEY),
+    )
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = frozenset(
+            Follow.objects.order_by().values('author').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=FEED_FANOUT_LIMIT
+            ).values_list('author', flat=True)
+        )
+        cache.set(key, author_ids, POPULAR_AUTHORS_CACHE_TIMEOUT)
+    return author_ids
+
+
+def feed_changed():
+    """
+    После коммита меняет версию лент: массовые операции с ними
+    не отправляют сигналов.
+    """
+    transaction.on_commit(lambda: bump_version(FeedItem))
+
+
+class FeedItemQuerySet(models.QuerySet):
+    """Поддержка лент подписок в актуальном состоянии."""
+
+    def fan_out(self, recipe):
+        """Раскладывает новый рецепт в ленты подписчиков автора."""
+        if is_popular_author(recipe.author_id):
+            return
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    recipe=recipe,
+                    author_id=recipe.author_id,
+                    pub_date=recipe.pub_date,
+                )
+                for user_id in Follow.objects.filter(
+                    author_id=recipe.author_id
+                ).values_list('user_id', flat=True).iterator()
+            ),
+            batch_size=FEED_FANOUT_LIMIT,
+            ignore_conflicts=True,
+        )
+        feed_changed()
+
+    def backfill(self, user, author):
+        """
+        Добавляет в ленту подписчика последние рецепты автора.
+        Если с этой подпиской автор стал популярным, меняется версия
+        набора популярных авторов.
+        """
+        followers = Follow.objects.filter(author=author).order_by()[
+            :FEED_FANOUT_LIMIT + 2
+        ].count()
+        if followers == FEED_FANOUT_LIMIT + 1:
+            popular_authors_changed()
+        if followers > FEED_FANOUT_LIMIT:
+            return
+        self.backfill_followers(author.id, Q(user=user))
+
+    def backfill_followers(self, author_id, condition=Q()):
+        """
+        Добавляет последние рецепты автора в ленты его подписчиков,
+        отобранных условием condition.
+        """
+        recipes = list(Recipe.objects.filter(author_id=author_id).order_by(
+            '-pub_date').values_list('id', 'pub_date')[:FEED_BACKFILL_SIZE])
+        if not recipes:
+            return
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for user_id in Follow.objects.filter(
+                    condition, author_id=author_id
+                ).values_list('user_id', flat=True).iterator()
+                for recipe_id, pub_date in recipes
+            ),
+            batch_size=FEED_FANOUT_LIMIT,
+            ignore_conflicts=True,
+        )
+        feed_changed()
+
+    def prune(self, user, author):
+        """
+        Убирает рецепты автора из ленты отписавшегося пользователя.
+        Если с этой отпиской автор перестал быть популярным, его
+        рецепты, которые не раскладывались по лентам, добавляются
+        в ленты оставшихся подписчиков.
+        """
+        deleted, _ = self.filter(user=user, author=author).delete()
+        if deleted:
+            feed_changed()
+        followers = Follow.objects.filter(author=author).order_by()[
+            :FEED_FANOUT_LIMIT + 1
+        ].count()
+        if followers == FEED_FANOUT_LIMIT:
+            self.backfill_followers(author.id)
+            popular_authors_changed()
+
+
+class FeedItem(models.Model):
+    """
+    Рецепт в ленте подписок пользователя.
+    Заполняется при публикации рецепта и при подписке на автора,
+    очищается при отписке.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    objects = FeedItemQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date'),
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx'
+            ),
+        )
+
+
+# Веса событий в оценке популярности рецепта.
+ACTIVITY_WEIGHTS = {
+    'favorites': 3,
+    'carts': 2,
+    'views': 1,
+}
+
+
+def activity_bucket(moment):
+    """Начало часа, в счётчик которого попадает событие."""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class RecipeActivityQuerySet(models.QuerySet):
+    """Почасовые счётчики событий рецептов."""
+
+    def add_events(self, events):
+        """
+        Прибавляет события {(recipe_id, bucket, вид): количество}
+        тремя запросами на любое число событий.
+        События удалённых рецептов пропускаются.
+        """
+        existing = set(Recipe.objects.filter(
+            pk__in={recipe_id for recipe_id, _, _ in events}
+        ).values_list('pk', flat=True))
+        events = {
+            key: count for key, count in events.items()
+            if key[0] in existing
+        }
+        keys = {(recipe_id, bucket) for recipe_id, bucket, _ in events}
+        if not keys:
+            return
+        self.bulk_create(
+            (
+                self.model(recipe_id=recipe_id, bucket=bucket)
+                for recipe_id, bucket in keys
+            ),
+            ignore_conflicts=True,
+        )
+        condition = Q()
+        for recipe_id, bucket in keys:
+            condition |= Q(recipe_id=recipe_id, bucket=bucket)
+        self.filter(condition).update(**{
+            kind: F(kind) + Case(
+                *(
+                    When(recipe_id=recipe_id, bucket=bucket,
+                         then=Value(count))
+                    for (recipe_id, bucket, event), count in events.items()
+                    if event == kind
+                ),
+                default=Value(0),
+                output_field=models.IntegerField(),
+            )
+            for kind in ACTIVITY_WEIGHTS
+        })
+
+    def scores(self, now, window_hours, half_life_hours):
+        """
+        Оценка рецептов за последние window_hours часов:
+        взвешенная сумма событий, вклад которых убывает вдвое
+        каждые half_life_hours часов.
+        """
+        current = activity_bucket(now)
+        decay = [
+            When(
+                bucket=current - timedelta(hours=age),
+                then=Value(0.5 ** (age / half_life_hours)),
+            )
+            for age in range(window_hours)
+        ]
+        events = sum(
+            (F(kind) * weight for kind, weight in ACTIVITY_WEIGHTS.items()),
+            Value(0),
+        )
+        return self.filter(
+            bucket__gt=current - timedelta(hours=window_hours)
+        ).values('recipe').annotate(score=Sum(ExpressionWrapper(
+            events * Case(*decay, default=Value(0.0)),
+            output_field=models.FloatField(),
+        ))).order_by('-score')
+
+
+class RecipeActivity(models.Model):
+    """
+    Сколько раз за час рецепт добавили в избранное, в корзину
+    и открыли. Старые часы удаляет команда materialize_trending.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Рецепт',
+    )
+    bucket = models.DateTimeField('Час')
+    favorites = models.IntegerField('Добавлений в избранное', default=0)
+    carts = models.IntegerField('Добавлений в корзину', default=0)
+    views = models.IntegerField('Просмотров', default=0)
+
+    objects = RecipeActivityQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-bucket',)
+        verbose_name = 'Активность по рецепту'
+        verbose_name_plural = 'Активность по рецептам'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'bucket'),
+                name='unique_recipe_activity'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('bucket',), name='activity_bucket_idx'),
+        )
+
+
+class TrendingRecipe(models.Model):
+    """Рецепт в рейтинге популярных за последнее время."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт',
+    )
+    rank = models.PositiveIntegerField('Место', db_index=True)
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ('rank',)
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+
+
+# Сколько хранятся записи журнала RecipeChange.
+RECIPE_CHANGES_RETENTION = timedelta(days=1)
+
+
+class RecipeChangeQuerySet(models.QuerySet):
+    """Журнал изменений рецептов."""
+
+    def record(self, recipe_ids):
+        """Записывает изменённые рецепты и удаляет устаревшие записи."""
+        now = timezone.now()
+        self.bulk_create(
+            RecipeChange(recipe_id=recipe_id, changed_at=now)
+            for recipe_id in recipe_ids
+        )
+        self.filter(changed_at__lt=now - RECIPE_CHANGES_RETENTION).delete()
+
+    def changed_since(self, moment):
+        """id рецептов, изменённых начиная с moment."""
+        return set(self.filter(changed_at__gte=moment).values_list(
+            'recipe_id', flat=True))
+
+
+class RecipeChange(models.Model):
+    """
+    Журнал созданных, изменённых и удалённых рецептов.
+    По нему воркеры обновляют свои индексы в памяти только
+    для изменившихся рецептов. Ссылка на рецепт — просто id,
+    чтобы запись пережила удаление рецепта.
+    """
+    recipe_id = models.IntegerField('Рецепт')
+    changed_at = models.DateTimeField('Изменён', db_index=True)
+
+    objects = RecipeChangeQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-changed_at',)
+        verbose_name = 'Изменение рецепта'
+        verbose_name_plural = 'Журнал изменений рецептов'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Рецепт, похожий на recipe по ингредиентам и тегам.
+    Списки заранее считает команда build_similar_recipes.
+    Ссылка на похожий рецепт без ограничения в базе: строки удалённых
+    рецептов отбрасывает JOIN, а пересчёт находит их по журналу.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbours',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='neighbour_of',
+        verbose_name='Похожий рецепт',
+    )
+    rank = models.PositiveSmallIntegerField('Место')
+    score = models.FloatField('Близость')
+    built_at = models.DateTimeField('Посчитан')
+
+    class Meta:
+        ordering = ('recipe', 'rank')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'rank'),
+                name='unique_similar_recipe_rank'
+            ),
+        )
+
+
+class SimilarRecipesBuild(models.Model):
+    """
+    Запуск команды build_similar_recipes. Время берётся до чтения
+    рецептов, поэтому изменения во время расчёта попадут в следующий
+    частичный пересчёт. Запуск без изменений тоже записывается, иначе
+    следующий пересчёт по устаревшему времени стал бы полным.
+    """
+    built_at = models.DateTimeField('Начат', db_index=True)
+    full = models.BooleanField('Полный пересчёт')
+    recipes = models.PositiveIntegerField('Пересчитано рецептов')
+
+    class Meta:
+        ordering = ('-built_at',)
+        verbose_name = 'Расчёт похожих рецептов'
+        verbose_name_plural = 'Расчёты похожих рецептов'
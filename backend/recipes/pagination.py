@@ -1,6 +1,244 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
 
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from foodgram.routers import use_replicas
+from recipes.models import POPULAR_ORDERING
+from recipes.signals import VERSIONED_MODELS
+from recipes.versions import get_version
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination, _reverse_ordering)
 
-class CustomPagination(PageNumberPagination):
+# Время жизни закэшированного количества объектов в секундах.
+COUNT_CACHE_TIMEOUT = 60
+# Начиная с этой оценки размера таблицы, количество объектов
+# без фильтров берётся из статистики базы, а не из COUNT(*).
+APPROXIMATE_COUNT_THRESHOLD = 10000
+
+
+def estimate_count(queryset):
+    """
+    Оценка количества строк таблицы модели по статистике базы:
+    pg_class.reltuples в PostgreSQL и MAX(rowid) в SQLite.
+    Возвращает None, если оценки нет.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass', [table]
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}'
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def read_models(using, sql):
+    """Модели с версиями, таблицы которых упоминаются в запросе sql."""
+    quote_name = connections[using].ops.quote_name
+    return [
+        model for model in VERSIONED_MODELS
+        if quote_name(model._meta.db_table) in sql
+    ]
+
+
+def get_count(queryset):
+    """
+    Возвращает (количество, точное ли оно) для queryset.
+    Для запросов без фильтров по большим таблицам отдаёт оценку,
+    остальные результаты COUNT(*) кэширует по подписи фильтров
+    и версиям моделей, таблицы которых читает запрос, так что
+    изменение этих данных сбрасывает кэш, а остальных — нет.
+    COUNT(*) для кэша считается в основной базе: отстающая реплика
+    сохранила бы старое количество под новыми версиями.
+    """
+    if not queryset.query.where and not queryset.query.distinct:
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate >= APPROXIMATE_COUNT_THRESHOLD:
+            return estimate, False
+    with use_replicas(False):
+        queryset = queryset.using(queryset.db)
+    sql = str(queryset.values('pk').query)
+    versions = '.'.join(
+        get_version(model) for model in read_models(queryset.db, sql)
+    )
+    signature = hashlib.md5(f'{versions}:{sql}'.encode()).hexdigest()
+    key = f'count:{queryset.db}:{queryset.model._meta.label_lower}:{signature}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count, True
+    return count, False
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator, который считает объекты queryset через get_count.
+    Готовые списки считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, list):
+            self.count_exact = True
+            return len(self.object_list)
+        count, self.count_exact = get_count(self.object_list)
+        return count
+
+
+class CachedCountPagination(PageNumberPagination):
+    """
+    Постраничный вывод с закэшированным или приблизительным count.
+    Поле count_exact в ответе сообщает, точное ли количество.
+    """
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_exact'] = self.page.paginator.count_exact
+        return response
+
+
+class CustomPagination(CachedCountPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Постраничный вывод рецептов по курсору без COUNT и OFFSET.
+    Курсор хранит значения всех полей сортировки последней строки
+    страницы, и следующая страница выбирается сравнением кортежей
+    (pub_date, id) < (p, i), поэтому рецепты с одинаковым pub_date
+    не пропускаются и не повторяются. Включается параметром
+    pagination=cursor.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        """
+        При ordering=popular листает рецепты по популярности:
+        курсор тогда хранит (favorites_count, pub_date, id), и курсор
+        одной сортировки не подходит для другой.
+        """
+        if request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return self.ordering
+
+    @staticmethod
+    def keyset_filter(ordering, position):
+        """
+        Условие «строка после position» для сортировки ordering:
+        (a, b, c) < (x, y, z) раскрывается в a <= x AND (a < x
+        OR a = x AND b < y OR a = x AND b = y AND c < z).
+        Первое условие даёт базе диапазон по индексу.
+        """
+        fields = [
+            (name.lstrip('-'), 'lt' if name.startswith('-') else 'gt')
+            for name in ordering
+        ]
+        after = Q()
+        for number, (name, lookup) in enumerate(fields):
+            after |= Q(
+                **{equal: value for (equal, _), value
+                   in zip(fields[:number], position)},
+                **{f'{name}__{lookup}': position[number]},
+            )
+        first, lookup = fields[0]
+        return Q(**{f'{first}__{lookup}e': position[0]}) & after
+
+    def get_position(self, instance):
+        return json.dumps([
+            instance._meta.get_field(name.lstrip('-')).value_to_string(
+                instance)
+            for name in self.ordering
+        ])
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        try:
+            values = json.loads(cursor.position)
+            if (
+                not isinstance(values, list)
+                or len(values) != len(self.ordering)
+            ):
+                raise ValueError
+            position = [
+                self.model._meta.get_field(name.lstrip('-')).to_python(
+                    value)
+                for name, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        self.cursor_position = cursor.position
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = _reverse_ordering(self.ordering) if reverse else (
+            self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(
+                self.keyset_filter(ordering, self.cursor.position)
+            )
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_link(self, reverse, instance):
+        # На пустой странице листаем от того же курсора.
+        position = (
+            self.cursor_position if instance is None
+            else self.get_position(instance)
+        )
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=reverse, position=position)
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.get_link(False, self.page[-1] if self.page else None)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.get_link(True, self.page[0] if self.page else None)
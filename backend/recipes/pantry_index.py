@@ -0,0 +1,150 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+from itertools import chain
+
+from django.utils import timezone
+from foodgram.routers import use_replicas
+from recipes.models import (RECIPE_CHANGES_RETENTION, AmountIngredient,
+                            Ingredient, RecipeChange)
+from recipes.versions import get_version
+
+# Записи журнала из параллельных транзакций могут стать видны
+# с опозданием, поэтому изменения перечитываются с запасом.
+CHANGES_OVERLAP = timedelta(minutes=1)
+# Если изменилось больше рецептов, индекс строится заново.
+REBUILD_THRESHOLD = 500
+
+
+def group_by_recipe(rows):
+    recipes = {}
+    for recipe_id, ingredient_id in rows:
+        recipes.setdefault(recipe_id, []).append(ingredient_id)
+    return recipes
+
+
+class PantryIndex:
+    """
+    Инвертированный индекс в памяти: ингредиент -> отсортированный
+    массив id рецептов с ним. По нему без запросов к базе считается,
+    сколько ингредиентов каждого рецепта есть у пользователя.
+    """
+
+    def __init__(self, rows):
+        self.recipes = {}
+        postings = {}
+        for recipe_id, ingredient_ids in group_by_recipe(rows).items():
+            self.recipes[recipe_id] = frozenset(ingredient_ids)
+            for ingredient_id in self.recipes[recipe_id]:
+                postings.setdefault(ingredient_id, []).append(recipe_id)
+        # Число ингредиентов рецепта по его id: массив быстрее словаря.
+        self.sizes = array('H', [0]) * (max(self.recipes, default=0) + 1)
+        for recipe_id, ingredient_ids in self.recipes.items():
+            self.sizes[recipe_id] = len(ingredient_ids)
+        self.postings = {
+            ingredient_id: array('I', sorted(recipe_ids))
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self.lock = threading.Lock()
+
+    def update(self, recipe_id, ingredient_ids):
+        """Заменяет состав рецепта; пустой состав убирает рецепт."""
+        new = frozenset(ingredient_ids)
+        with self.lock:
+            old = self.recipes.pop(recipe_id, frozenset())
+            for ingredient_id in old - new:
+                postings = self.postings[ingredient_id]
+                index = bisect_left(postings, recipe_id)
+                if index < len(postings) and postings[index] == recipe_id:
+                    del postings[index]
+            for ingredient_id in new - old:
+                insort(
+                    self.postings.setdefault(ingredient_id, array('I')),
+                    recipe_id,
+                )
+            if new:
+                self.recipes[recipe_id] = new
+            if recipe_id >= len(self.sizes):
+                self.sizes.extend([0] * (recipe_id + 1 - len(self.sizes)))
+            self.sizes[recipe_id] = len(new)
+
+    def rank(self, pantry, max_missing=None):
+        """
+        Рецепты хотя бы с одним ингредиентом из pantry в виде
+        [(id рецепта, сколько ингредиентов не хватает)]: сначала те,
+        для которых есть всё, затем без одного, двух и т.д.,
+        при равенстве — с большим числом совпадений и более новые.
+        """
+        with self.lock:
+            hits = Counter(chain.from_iterable(
+                self.postings.get(ingredient_id, ())
+                for ingredient_id in set(pantry)
+            ))
+            # Различных (не хватает, совпало) немного: сортируются группы,
+            # а не все рецепты с составными ключами.
+            groups = {}
+            for recipe_id, count in hits.items():
+                key = (self.sizes[recipe_id] - count, -count)
+                if max_missing is None or key[0] <= max_missing:
+                    groups.setdefault(key, []).append(recipe_id)
+        ranked = []
+        for missing, count in sorted(groups):
+            recipe_ids = groups[missing, count]
+            recipe_ids.sort(reverse=True)
+            ranked.extend(zip(recipe_ids, [missing] * len(recipe_ids)))
+        return ranked
+
+
+_index = None
+_versions = None
+_synced = None
+_lock = threading.Lock()
+
+
+def _sync(versions):
+    """
+    Обновляет только рецепты из журнала RecipeChange, а после
+    изменения справочника ингредиентов, массовой загрузки или долгого
+    простоя воркера строит индекс заново.
+    """
+    global _index, _versions, _synced
+    now = timezone.now()
+    changed = None
+    if (
+        _index is not None
+        and versions[0] == _versions[0]
+        and now - _synced < RECIPE_CHANGES_RETENTION - CHANGES_OVERLAP
+    ):
+        changed = RecipeChange.objects.changed_since(
+            _synced - CHANGES_OVERLAP
+        )
+    if changed is None or len(changed) > REBUILD_THRESHOLD:
+        _index = PantryIndex(AmountIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id').iterator())
+    elif changed:
+        recipes = group_by_recipe(AmountIngredient.objects.filter(
+            recipe_id__in=changed
+        ).values_list('recipe_id', 'ingredient_id'))
+        for recipe_id in changed:
+            _index.update(recipe_id, recipes.get(recipe_id, ()))
+    _versions = versions
+    _synced = now
+
+
+def get_pantry_index():
+    """
+    Возвращает индекс ингредиентов рецептов текущего воркера.
+    Индекс обновляется, когда меняется версия справочника ингредиентов
+    или журнала изменений рецептов. Журнал и ингредиенты читаются
+    из основной базы: на реплике новых записей может ещё не быть,
+    и они потерялись бы для индекса насовсем.
+    """
+    versions = (get_version(Ingredient), get_version(RecipeChange))
+    if versions != _versions:
+        with _lock:
+            if versions != _versions:
+                with use_replicas(False):
+                    _sync(versions)
+    return _index
@@ -1,9 +1,16 @@
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import (AmountIngredient, Cart, Favorites, Ingredient,
-                            Recipe, Tag)
-from rest_framework.serializers import (ModelSerializer, ReadOnlyField,
-                                        SerializerMethodField, ValidationError)
+from recipes.fields import ImageSizeField, ImageSizesField
+from recipes.models import (AmountIngredient, Cart, Favorites, FeedItem,
+                            Ingredient, Recipe, RecipeQuerySet,
+                            ShoppingListItem, Tag)
+from recipes.signals import shopping_lists_in_bulk
+from recipes.versions import bump_version
+from rest_framework.exceptions import NotFound
+from rest_framework.serializers import (IntegerField, ModelSerializer,
+                                        ReadOnlyField, SerializerMethodField,
+                                        ValidationError)
 from users.serializers import CustomUserSerializer
 
 
@@ -38,7 +45,7 @@ class AmountIngredientSerializer(ModelSerializer):
 
 class FavoritesSerializer(ModelSerializer):
     """Сериализатор рецепта в подписках."""
-    image = Base64ImageField(read_only=True)
+    image = ImageSizeField('thumbnail')
 
     class Meta:
         model = Recipe
@@ -53,29 +60,47 @@ class RecipeSerializer(ModelSerializer):
     ingredients = AmountIngredientSerializer(
         source='amount_ingredient', read_only=True, many=True
     )
+    images = ImageSizesField()
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'image', 'tags', 'author', 'ingredients',
+            'id', 'name', 'image', 'images', 'tags', 'author', 'ingredients',
             'text', 'cooking_time', 'is_favorited', 'is_in_shopping_cart'
         )
 
-    def get_check(self, recipe, model):
-        """Из get_is_favorited, get_is_in_shopping_cart."""
+    def to_representation(self, recipe):
+        """
+        Передаёт автору аннотацию подписки из queryset рецептов
+        и подгружает теги и ингредиенты, если их нет в кэше
+        (например, после создания или редактирования рецепта).
+        """
+        if hasattr(recipe, 'is_subscribed'):
+            recipe.author.is_subscribed = recipe.is_subscribed
+        prefetch_related_objects([recipe], *RecipeQuerySet.read_prefetches())
+        return super().to_representation(recipe)
+
+    def get_check(self, recipe, model, annotation):
+        """
+        Из get_is_favorited, get_is_in_shopping_cart.
+        Берёт значение из аннотации RecipeQuerySet.with_user_flags,
+        а для неаннотированного рецепта делает запрос.
+        """
+        if hasattr(recipe, annotation):
+            return getattr(recipe, annotation)
         user = self.context.get('request').user
         return not user.is_anonymous and model.objects.filter(
             user=user, recipe=recipe).exists()
 
     def get_is_favorited(self, recipe):
         """Проверяет добавлен ли пользователем рецепт в избранное."""
-        return self.get_check(recipe, Favorites)
+        return self.get_check(recipe, Favorites, 'is_favorited')
 
     def get_is_in_shopping_cart(self, recipe):
         """Проверяет добавлен ли пользователем рецепт в корзину."""
-        return self.get_check(recipe, Cart)
+        return self.get_check(recipe, Cart, 'is_in_shopping_cart')
 
     def validate(self, data):
         """Проверяет входные данные для создания и редактирования рецепта."""
@@ -90,29 +115,95 @@ class RecipeSerializer(ModelSerializer):
             if Recipe.objects.filter(author=user, name=name).exists():
                 raise ValidationError(f'Рецепт {name} уже существует.')
 
-        ingredients = self.initial_data.get('ingredients')
+        data['ingredients'] = self.validate_ingredients_data(
+            self.initial_data.get('ingredients')
+        )
+        return data
+
+    def validate_ingredients_data(self, ingredients):
+        """
+        Проверяет ингредиенты рецепта одним запросом к базе
+        и приводит id и количество к целым числам.
+        """
         if not ingredients:
             raise ValidationError('В рецепте нет ингредиентов.')
-        ingredients_set = set()
-        for ingredient in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=ingredient['id'])
-            if not Ingredient.objects.filter(name=ingredient).exists():
-                return None
-            if ingredient in ingredients_set:
-                raise ValidationError('Ингридиенты повторяются')
-            ingredients_set.add(ingredient)
-        data['ingredients'] = ingredients
-        return data
+        try:
+            amounts = [
+                (int(ingredient['id']), int(ingredient['amount']))
+                for ingredient in ingredients
+            ]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                'У ингредиента должны быть числовые id и amount.'
+            )
+        ids = {ingredient_id for ingredient_id, _ in amounts}
+        if len(ids) != len(amounts):
+            raise ValidationError('Ингридиенты повторяются')
+        if any(amount < 1 for _, amount in amounts):
+            raise ValidationError('Минимальное количество ингредиентов 1')
+        missing = ids - set(Ingredient.objects.filter(
+            id__in=ids).values_list('id', flat=True))
+        if missing:
+            raise NotFound(f'Ингредиенты не найдены: {sorted(missing)}')
+        return [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in amounts
+        ]
 
     def create_ingredients(self, ingredients, recipe):
-        """Записывает количество ингредиентов в рецепте."""
-        for ingredient in ingredients:
-            AmountIngredient.objects.create(
+        """
+        Записывает количество ингредиентов в рецепте.
+        Массовые операции не отправляют сигналов, поэтому версия
+        ингредиентов рецептов меняется здесь явно.
+        """
+        transaction.on_commit(lambda: bump_version(AmountIngredient))
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(
                 recipe=recipe,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount'),
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount'],
             )
+            for ingredient in ingredients
+        )
 
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Применяет к ингредиентам рецепта только изменения:
+        удаляет убранные, обновляет количество и добавляет новые.
+        Возвращает прежнее количество ингредиентов.
+        """
+        old_items = {
+            item.ingredient_id: item
+            for item in recipe.amount_ingredient.all()
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in old_items.items()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = old_items.keys() - new_amounts.keys()
+        if removed:
+            recipe.amount_ingredient.filter(
+                ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, item in old_items.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and amount != item.amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            AmountIngredient.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients(
+            (ingredient for ingredient in ingredients
+             if ingredient['id'] not in old_items),
+            recipe,
+        )
+        return old_amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         """Создаёт рецепт."""
         image = validated_data.pop('image')
@@ -120,10 +211,17 @@ class RecipeSerializer(ModelSerializer):
         recipe = Recipe.objects.create(image=image, **validated_data)
         recipe.tags.set(self.initial_data.get('tags'))
         self.create_ingredients(ingredients, recipe)
+        recipe.update_image_sizes()
+        FeedItem.objects.fan_out(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Редактирует рецепт."""
+        """
+        Редактирует рецепт, применяя изменения тегов и ингредиентов,
+        и обновляет списки покупок с ним.
+        """
+        old_image = instance.image.name
         instance.image = validated_data.get('image', instance.image)
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
@@ -131,9 +229,28 @@ class RecipeSerializer(ModelSerializer):
             'cooking_time', instance.cooking_time
         )
         ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.ingredients.clear()
         instance.tags.set(self.initial_data.get('tags'))
-        self.create_ingredients(ingredients, instance)
-        instance.save()
+        # Массовые операции с ингредиентами не отправляют сигналов,
+        # поэтому списки покупок меняются одним действием здесь.
+        with shopping_lists_in_bulk(instance.pk):
+            old_amounts = self.update_ingredients(ingredients, instance)
+            ShoppingListItem.objects.change_recipe(
+                instance.pk,
+                old_amounts,
+                {ingredient['id']: ingredient['amount']
+                 for ingredient in ingredients},
+            )
+        # Счётчики и маска тегов меняются отдельными UPDATE,
+        # поэтому сохраняются только редактируемые поля.
+        instance.save(update_fields=('image', 'name', 'text', 'cooking_time'))
+        if instance.image.name != old_image:
+            instance.update_image_sizes()
         return instance
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """Рецепт в подборке по ингредиентам пользователя."""
+    missing_ingredients = IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing_ingredients',)
@@ -0,0 +1,289 @@
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from recipes.activity import flush_due_events
+from recipes.models import (FEED_FANOUT_LIMIT, MAX_TAGS,
+                            POPULAR_AUTHORS_VERSION_KEY, RECIPE_COUNTERS,
+                            AmountIngredient, Cart, Favorites, FeedItem,
+                            Ingredient, Recipe, RecipeChange, ShoppingListItem,
+                            Tag, free_tag_bits)
+from recipes.versions import bump_version
+from rest_framework.authtoken.models import Token
+from users.models import Follow, MyToken, User
+
+# Модели, версия данных которых меняется при каждом изменении.
+VERSIONED_MODELS = (
+    Tag, Ingredient, Recipe, AmountIngredient, Favorites, Cart, Follow, User,
+    FeedItem,
+)
+# Ленты меняются массовыми операциями FeedItemQuerySet, которые сами
+# меняют их версию. Построчные сигналы для них не подключаются, чтобы
+# каскад удалял строки лент одним запросом, не загружая их.
+SIGNAL_VERSIONED_MODELS = tuple(
+    model for model in VERSIONED_MODELS if model is not FeedItem
+)
+# Поля, сохранение только которых не меняет версию: last_login
+# пишется при каждом входе и нигде не выводится.
+UNVERSIONED_FIELDS = frozenset({'last_login'})
+
+# Рецепты, которые удаляются целиком или ингредиенты которых меняются
+# массово: списки покупок для них меняются одним действием, а сигналы
+# отдельных строк корзины, избранного и ингредиентов пропускаются.
+_bulk_recipe_ids = set()
+# Удаляемые пользователи: их списки покупок удалятся каскадом.
+_deleted_user_ids = set()
+
+
+@contextmanager
+def shopping_lists_in_bulk(recipe_id):
+    """
+    Отключает построчное обновление списков покупок для рецепта:
+    изменения внутри блока переносятся в списки явно.
+    """
+    _bulk_recipe_ids.add(recipe_id)
+    try:
+        yield
+    finally:
+        _bulk_recipe_ids.discard(recipe_id)
+
+
+def is_versioned_save(update_fields):
+    return not update_fields or not update_fields <= UNVERSIONED_FIELDS
+
+
+def bump_model_version(sender, update_fields=None, **kwargs):
+    """
+    Меняет версию данных модели после коммита. Для прокси-моделей
+    меняется версия исходной модели.
+    """
+    if is_versioned_save(update_fields):
+        model = sender._meta.concrete_model
+        transaction.on_commit(lambda: bump_version(model))
+
+
+def bump_user_version(sender, instance, update_fields=None, **kwargs):
+    """
+    Меняет версию одного пользователя: по ней воркеры убирают
+    из кеша токенов только его.
+    """
+    if is_versioned_save(update_fields):
+        user_id = instance.pk
+        transaction.on_commit(lambda: bump_version(User, user_id))
+
+
+def bump_recipe_version(sender, **kwargs):
+    """Меняет версию рецептов после изменения их тегов или ингредиентов."""
+    transaction.on_commit(lambda: bump_version(Recipe))
+
+
+def bump_author_recipes_version(sender, instance, created,
+                                update_fields=None, **kwargs):
+    """Меняет версию рецептов, если изменились данные их автора."""
+    if (
+        not created
+        and is_versioned_save(update_fields)
+        and instance.recipes.exists()
+    ):
+        transaction.on_commit(lambda: bump_version(Recipe))
+
+
+def assign_tag_bit(sender, instance, **kwargs):
+    """Выдаёт новому тегу свободный бит маски тегов."""
+    if instance.bit is None:
+        instance.bit = next(free_tag_bits(), None)
+        if instance.bit is None:
+            raise ValidationError(f'Тегов не может быть больше {MAX_TAGS}')
+
+
+def update_tag_masks(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчитывает tag_mask рецептов, у которых изменились теги."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    elif pk_set:
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    else:
+        recipes = Recipe.objects.with_tags(instance.mask)
+    recipes.update_tag_masks()
+
+
+def release_tag_bit(sender, instance, **kwargs):
+    """Убирает бит удалённого тега из масок его рецептов."""
+    Recipe.objects.with_tags(instance.mask).update_tag_masks()
+
+
+def bump_feed_version(sender, **kwargs):
+    """Меняет версию лент, из которых каскадом удалён рецепт."""
+    transaction.on_commit(lambda: bump_version(FeedItem))
+
+
+def record_recipe_change(sender, instance, **kwargs):
+    """
+    Записывает рецепт в журнал изменений после коммита, когда его
+    ингредиенты уже сохранены, и меняет версию журнала.
+    """
+    recipe_id = instance.pk
+
+    def record():
+        RecipeChange.objects.record((recipe_id,))
+        bump_version(RecipeChange)
+
+    transaction.on_commit(record)
+
+
+def backfill_unfollowed_authors(sender, instance, **kwargs):
+    """
+    Авторы, которые перестанут быть популярными, когда каскадом
+    удалятся подписки удаляемого пользователя, после коммита получают
+    свои рецепты в лентах оставшихся подписчиков.
+    """
+    author_ids = list(Follow.objects.filter(
+        author__in=Follow.objects.filter(user=instance).values('author')
+    ).order_by().values('author').annotate(followers=Count('id')).filter(
+        followers=FEED_FANOUT_LIMIT + 1
+    ).values_list('author', flat=True))
+
+    def backfill():
+        for author_id in author_ids:
+            FeedItem.objects.backfill_followers(author_id)
+        bump_version(Follow, POPULAR_AUTHORS_VERSION_KEY)
+
+    if author_ids:
+        transaction.on_commit(backfill)
+
+
+def count_added_recipe(sender, instance, created, **kwargs):
+    """Увеличивает счётчик рецепта, добавленного в избранное или корзину."""
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).change_counter(
+            RECIPE_COUNTERS[sender], 1)
+
+
+def count_removed_recipe(sender, instance, **kwargs):
+    """
+    Уменьшает счётчик рецепта, убранного из избранного или корзины,
+    в том числе каскадом при удалении пользователя и в админке.
+    Счётчики удаляемого рецепта не меняются.
+    """
+    if instance.recipe_id not in _bulk_recipe_ids:
+        Recipe.objects.filter(pk=instance.recipe_id).change_counter(
+            RECIPE_COUNTERS[sender], -1)
+
+
+def add_cart_to_shopping_list(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта из новой корзины в список покупок."""
+    if created and instance.recipe_id not in _bulk_recipe_ids:
+        ShoppingListItem.objects.add_recipe(
+            instance.user_id, instance.recipe_id)
+
+
+def remove_cart_from_shopping_list(sender, instance, **kwargs):
+    """
+    Вычитает ингредиенты рецепта удалённой корзины из списка покупок.
+    После удаления корзины вычитаются только оставшиеся ингредиенты:
+    если каскад уже удалил их, их вычел сигнал ингредиентов.
+    """
+    if (instance.recipe_id in _bulk_recipe_ids
+            or instance.user_id in _deleted_user_ids):
+        return
+    ShoppingListItem.objects.add_recipe(
+        instance.user_id, instance.recipe_id, sign=-1)
+
+
+def remember_saved_amount(sender, instance, **kwargs):
+    """Запоминает сохранённое количество ингредиента перед изменением."""
+    instance._saved_amount = {}
+    if instance.pk and instance.recipe_id not in _bulk_recipe_ids:
+        instance._saved_amount = dict(AmountIngredient.objects.filter(
+            pk=instance.pk).values_list('ingredient_id', 'amount'))
+
+
+def change_amount_in_shopping_lists(sender, instance, **kwargs):
+    """
+    Переносит изменение ингредиента рецепта в списки покупок
+    пользователей, у которых рецепт лежит в корзине.
+    """
+    if instance.recipe_id in _bulk_recipe_ids:
+        return
+    ShoppingListItem.objects.change_recipe(
+        instance.recipe_id,
+        getattr(instance, '_saved_amount', {}),
+        {instance.ingredient_id: instance.amount},
+    )
+
+
+def remove_amount_from_shopping_lists(sender, instance, **kwargs):
+    """Вычитает удалённый ингредиент рецепта из списков покупок."""
+    if instance.recipe_id not in _bulk_recipe_ids:
+        ShoppingListItem.objects.change_recipe(
+            instance.recipe_id, {instance.ingredient_id: instance.amount}, {})
+
+
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """
+    Вычитает удаляемый рецепт из списков покупок одним действием
+    до каскада, который удалит его корзины и ингредиенты.
+    """
+    ShoppingListItem.objects.change_recipe(
+        instance.pk,
+        dict(instance.amount_ingredient.values_list(
+            'ingredient_id', 'amount')),
+        {},
+    )
+    _bulk_recipe_ids.add(instance.pk)
+
+
+def forget_deleted_recipe(sender, instance, **kwargs):
+    _bulk_recipe_ids.discard(instance.pk)
+
+
+def remember_deleted_user(sender, instance, **kwargs):
+    _deleted_user_ids.add(instance.pk)
+
+
+def forget_deleted_user(sender, instance, **kwargs):
+    _deleted_user_ids.discard(instance.pk)
+
+
+for model in SIGNAL_VERSIONED_MODELS:
+    post_save.connect(bump_model_version, sender=model)
+    post_delete.connect(bump_model_version, sender=model)
+m2m_changed.connect(bump_recipe_version, sender=Recipe.tags.through)
+post_save.connect(bump_recipe_version, sender=AmountIngredient)
+post_delete.connect(bump_recipe_version, sender=AmountIngredient)
+post_save.connect(bump_author_recipes_version, sender=User)
+m2m_changed.connect(update_tag_masks, sender=Recipe.tags.through)
+pre_save.connect(assign_tag_bit, sender=Tag)
+post_delete.connect(release_tag_bit, sender=Tag)
+# Удаление токена (выход из системы или в админке через MyToken)
+# сбрасывает кеш токенов воркеров.
+for model in (Token, MyToken):
+    post_delete.connect(bump_model_version, sender=model)
+post_save.connect(bump_user_version, sender=User)
+post_delete.connect(bump_user_version, sender=User)
+pre_delete.connect(backfill_unfollowed_authors, sender=User)
+post_save.connect(record_recipe_change, sender=Recipe)
+post_delete.connect(record_recipe_change, sender=Recipe)
+post_delete.connect(bump_feed_version, sender=Recipe)
+request_finished.connect(flush_due_events)
+for model in RECIPE_COUNTERS:
+    post_save.connect(count_added_recipe, sender=model)
+    post_delete.connect(count_removed_recipe, sender=model)
+# Списки покупок следят за корзинами и ингредиентами рецептов,
+# в том числе при каскадном удалении и правке в админке.
+post_save.connect(add_cart_to_shopping_list, sender=Cart)
+post_delete.connect(remove_cart_from_shopping_list, sender=Cart)
+pre_save.connect(remember_saved_amount, sender=AmountIngredient)
+post_save.connect(change_amount_in_shopping_lists, sender=AmountIngredient)
+post_delete.connect(remove_amount_from_shopping_lists,
+                    sender=AmountIngredient)
+pre_delete.connect(remove_recipe_from_shopping_lists, sender=Recipe)
+post_delete.connect(forget_deleted_recipe, sender=Recipe)
+pre_delete.connect(remember_deleted_user, sender=User)
+post_delete.connect(forget_deleted_user, sender=User)
@@ -0,0 +1,102 @@
+import numpy as np
+from scipy import sparse
+
+# Близость рецептов по ингредиентам и тегам. Модуль не импортирует
+# Django, чтобы его можно было загрузить в процессах пула
+# команды build_similar_recipes.
+_ingredients = None
+_ingredients_transposed = None
+_tags = None
+_neighbours = None
+
+
+def feature_matrix(rows, columns, shape):
+    """
+    Разреженная матрица рецепт x признак (ингредиент или тег)
+    с весами IDF: общие для многих рецептов признаки вроде соли
+    весят меньше. Строки нормированы, так что скалярное
+    произведение строк — косинусная близость рецептов.
+    """
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=shape,
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    frequency = np.bincount(matrix.indices, minlength=shape[1])
+    idf = np.log(shape[0] / np.maximum(frequency, 1)).astype(np.float32)
+    matrix = matrix @ sparse.diags(idf)
+    # Признак, который есть у всех рецептов, ничего не различает.
+    matrix.eliminate_zeros()
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def init_worker(matrix, tag_column, neighbours):
+    """
+    Передаёт процессу пула матрицу признаков: столбцы ингредиентов
+    и столбцы тегов начиная с tag_column хранятся отдельно.
+    """
+    global _ingredients, _ingredients_transposed, _tags, _neighbours
+    matrix = matrix.tocsc()
+    _ingredients = matrix[:, :tag_column].tocsr()
+    _ingredients_transposed = _ingredients.T.tocsr()
+    _tags = matrix[:, tag_column:].tocsr()
+    _neighbours = neighbours
+
+
+def similarities(rows):
+    """
+    Близость рецептов rows к рецептам с общими ингредиентами.
+    Тегов мало и они есть почти у всех рецептов, поэтому кандидаты
+    ищутся только по ингредиентам, а вклад тегов прибавляется
+    к найденным парам: иначе произведение было бы почти плотным.
+    """
+    candidates = (_ingredients[rows] @ _ingredients_transposed).tocoo()
+    tags = _tags[rows[candidates.row]].multiply(_tags[candidates.col])
+    return sparse.csr_matrix(
+        (candidates.data + tags.sum(axis=1).A1,
+         (candidates.row, candidates.col)),
+        shape=candidates.shape,
+    )
+
+
+def nearest(rows):
+    """
+    Для строк rows считает близость к рецептам с общими
+    ингредиентами и оставляет _neighbours самых близких,
+    кроме самого рецепта.
+    Возвращает массивы (строка, сосед, близость, место).
+    """
+    rows = np.asarray(rows)
+    similarity = similarities(rows)
+    result_rows, result_columns, result_scores, result_ranks = [], [], [], []
+    for position, row in enumerate(rows):
+        start, end = similarity.indptr[position:position + 2]
+        columns = similarity.indices[start:end]
+        scores = similarity.data[start:end]
+        keep = (columns != row) & (scores > 0)
+        columns, scores = columns[keep], scores[keep]
+        if len(scores) > _neighbours:
+            top = np.argpartition(-scores, _neighbours)[:_neighbours]
+            columns, scores = columns[top], scores[top]
+        order = np.lexsort((-columns, -scores))
+        result_rows.append(np.full(len(order), row))
+        result_columns.append(columns[order])
+        result_scores.append(scores[order])
+        result_ranks.append(np.arange(1, len(order) + 1))
+    return tuple(
+        np.concatenate(result)
+        for result in (result_rows, result_columns, result_scores,
+                       result_ranks)
+    )
+
+
+def best_scores(rows):
+    """
+    Наибольшая близость каждого рецепта к рецептам из rows:
+    по ней видно, чьи списки похожих могут измениться.
+    """
+    similarity = similarities(np.asarray(rows))
+    return similarity.max(axis=0).toarray().ravel()
@@ -0,0 +1,36 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, которое называет файлы по SHA-256 содержимого.
+    Одинаковые файлы хранятся один раз: если такой файл уже есть,
+    запись на диск пропускается, а у файла обновляется время
+    изменения. Файлы могут использоваться
+    несколькими рецептами, поэтому не удаляются при изменении рецепта,
+    а собираются командой collect_images.
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            return super().save(name, content, max_length)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        try:
+            # Свежее время изменения не даёт collect_images удалить
+            # файл, пока ссылка на него ещё не сохранена в базе.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length)
+        return name
@@ -0,0 +1,132 @@
+"""
+Данные для тестов и команды check_query_counts: пользователи,
+рецепты, подписки и списки, в которых всего ровно size строк.
+"""
+from io import BytesIO
+from types import SimpleNamespace
+
+from django.core.files.base import ContentFile
+from django.test import Client
+from django.utils import timezone
+from PIL import Image
+from recipes.models import (AmountIngredient, Cart, Favorites, FeedItem,
+                            Ingredient, Recipe, SimilarRecipe, Tag,
+                            TrendingRecipe)
+from recipes.signals import VERSIONED_MODELS
+from recipes.versions import bump_version
+from rest_framework.authtoken.models import Token
+from users.models import Follow, User
+
+PASSWORD = 'Query-count-1'
+PIXEL = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+def recipe_payload(ctx, offset=0):
+    """Рецепт с size ингредиентами и тегами."""
+    ingredients = ctx.ingredient_ids[offset:offset + ctx.size]
+    return {
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': PIXEL,
+        'tags': ctx.tag_ids,
+        'ingredients': [
+            {'id': ingredient_id, 'amount': amount + 1}
+            for amount, ingredient_id in enumerate(ingredients)
+        ],
+    }
+
+
+def make_user(name):
+    user = User.objects.create_user(
+        username=name, email=f'{name}@example.com', password=PASSWORD,
+        first_name='Имя', last_name='Фамилия',
+    )
+    user.token = Token.objects.create(user=user).key
+    return user
+
+
+def make_recipes(author, ctx, image):
+    """size рецептов автора, в каждом size ингредиентов и тегов."""
+    Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт {number}', text='Описание',
+               cooking_time=10, image=image)
+        for number in range(ctx.size)
+    )
+    recipes = list(Recipe.objects.filter(author=author).order_by('id'))
+    AmountIngredient.objects.bulk_create(
+        AmountIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                         amount=10)
+        for recipe in recipes
+        for ingredient_id in ctx.ingredient_ids[:ctx.size]
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+        for recipe in recipes
+        for tag_id in ctx.tag_ids
+    )
+    Recipe.objects.filter(author=author).update_tag_masks()
+    return [recipe.id for recipe in recipes]
+
+
+def build_fixture(size):
+    """Данные, в которых всего, что выводится списком, ровно size."""
+    ctx = SimpleNamespace(size=size)
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {number}', color=f'{number:06X}',
+            slug=f'tag{number}', bit=number)
+        for number in range(size)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(2 * size)
+    )
+    ctx.tag_ids = list(Tag.objects.values_list('id', flat=True))
+    ctx.tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+    ctx.ingredient_ids = list(
+        Ingredient.objects.order_by('id').values_list('id', flat=True)
+    )
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, 'PNG')
+    image = Recipe.image.field.storage.save(
+        'recipes/images/query_counts.png', ContentFile(buffer.getvalue())
+    )
+    ctx.me = make_user('me_user')
+    ctx.stranger = make_user('stranger')
+    ctx.spares = [make_user(f'spare{number}') for number in range(3)]
+    authors = [make_user(f'author{number}') for number in range(size)]
+    ctx.author_ids = [author.id for author in authors]
+    ctx.my_recipe_ids = make_recipes(ctx.me, ctx, image)
+    ctx.stranger_recipe_ids = make_recipes(ctx.stranger, ctx, image)
+    ctx.recipe_ids = []
+    for author in authors:
+        ctx.recipe_ids += make_recipes(author, ctx, image)
+        Follow.objects.create(user=ctx.me, author=author)
+        FeedItem.objects.backfill(ctx.me, author)
+    for recipe_id in ctx.recipe_ids[:size]:
+        Favorites.objects.create(user=ctx.me, recipe_id=recipe_id)
+        Cart.objects.create(user=ctx.me, recipe_id=recipe_id)
+    TrendingRecipe.objects.bulk_create(
+        TrendingRecipe(recipe_id=recipe_id, rank=rank, score=1.0)
+        for rank, recipe_id in enumerate(ctx.recipe_ids[:size], start=1)
+    )
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=ctx.recipe_ids[0], similar_id=recipe_id,
+                      rank=rank, score=1 / rank, built_at=timezone.now())
+        for rank, recipe_id in enumerate(
+            (ctx.my_recipe_ids + ctx.stranger_recipe_ids)[:size], start=1)
+    )
+    for model in VERSIONED_MODELS:
+        bump_version(model)
+    ctx.clients = {'anon': Client(raise_request_exception=False)}
+    for name, user in (('me', ctx.me), *(
+        (f'spare{number}', spare) for number, spare in enumerate(ctx.spares)
+    )):
+        ctx.clients[name] = Client(
+            raise_request_exception=False,
+            HTTP_AUTHORIZATION=f'Token {user.token}',
+        )
+    return ctx
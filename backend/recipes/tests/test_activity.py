@@ -0,0 +1,27 @@
+import time
+
+from recipes import activity
+from recipes.models import RecipeActivity
+
+
+def test_views_are_buffered_until_flush_is_due(anon, data, monkeypatch):
+    recipe_id = data.recipe_ids[0]
+
+    assert anon.get(f'/api/recipes/{recipe_id}/').status_code == 200
+    assert not RecipeActivity.objects.exists()
+
+    monkeypatch.setattr(
+        activity, '_started', time.monotonic() - activity.FLUSH_SECONDS)
+    anon.get('/api/tags/')
+
+    assert list(RecipeActivity.objects.values_list(
+        'recipe_id', 'views')) == [(recipe_id, 1)]
+
+
+def test_flush_writes_remaining_events(data):
+    activity.record_event(data.recipe_ids[0], 'favorites')
+    activity.record_event(data.recipe_ids[0], 'favorites')
+
+    activity.flush_events()
+
+    assert RecipeActivity.objects.get().favorites == 2
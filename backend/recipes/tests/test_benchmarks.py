@@ -0,0 +1,27 @@
+import pytest
+from django.core.management import CommandError, call_command
+from recipes.tests.factories import build_fixture
+from users.models import User
+
+
+def test_empty_database_asks_for_dataset(db):
+    with pytest.raises(CommandError, match='generate_dataset'):
+        call_command('run_benchmarks', '--requests', '1')
+
+
+def test_users_without_recipes_are_not_enough(db):
+    User.objects.create_user(
+        username='lonely', email='lonely@example.com', password='x')
+
+    with pytest.raises(CommandError, match='Рецепты'):
+        call_command('run_benchmarks', '--requests', '1')
+
+
+@pytest.mark.parametrize('option, value', (
+    ('--requests', '0'), ('--warmup', '-1'),
+))
+def test_request_counts_are_checked(db, option, value):
+    build_fixture(1)
+
+    with pytest.raises(CommandError, match='--requests'):
+        call_command('run_benchmarks', option, value)
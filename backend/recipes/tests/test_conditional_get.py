@@ -0,0 +1,72 @@
+import pytest
+from recipes.tests.factories import PASSWORD
+
+
+@pytest.mark.parametrize('path', (
+    '/api/recipes/', '/api/recipes/count/', '/api/tags/',
+))
+def test_repeated_get_returns_not_modified(me, path):
+    etag = me.get(path)['ETag']
+
+    response = me.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+    assert response.content == b''
+
+
+def test_favorite_changes_etag(me, data, django_capture_on_commit_callbacks):
+    etag = me.get('/api/recipes/')['ETag']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        me.post(f'/api/recipes/{data.stranger_recipe_ids[0]}/favorite/')
+
+    response = me.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+def test_anonymous_etag_ignores_user_relations(
+    me, anon, data, django_capture_on_commit_callbacks
+):
+    etag = anon.get('/api/recipes/')['ETag']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        me.post(f'/api/recipes/{data.stranger_recipe_ids[0]}/favorite/')
+        me.post(f'/api/users/{data.stranger.id}/subscribe/')
+
+    assert anon.get(
+        '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+    ).status_code == 304
+
+
+def test_author_change_changes_anonymous_etag(
+    anon, data, django_capture_on_commit_callbacks
+):
+    etag = anon.get('/api/recipes/')['ETag']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        data.stranger.first_name = 'Другое'
+        data.stranger.save()
+
+    assert anon.get(
+        '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+    ).status_code == 200
+
+
+def test_login_keeps_etag(me, anon, data, django_capture_on_commit_callbacks):
+    etag = me.get('/api/recipes/')['ETag']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = anon.post('/api/auth/token/login/', {
+            'email': data.spares[2].email, 'password': PASSWORD,
+        })
+
+    assert response.status_code == 200
+    assert me.get(
+        '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+    ).status_code == 304
+
+
+def test_etag_depends_on_authorization(me, anon):
+    assert me.get('/api/recipes/')['ETag'] != anon.get(
+        '/api/recipes/')['ETag']
@@ -0,0 +1,105 @@
+import pytest
+from recipes import models, signals
+from recipes.models import FeedItem, Recipe, get_popular_author_ids
+from users.models import Follow
+
+
+@pytest.fixture
+def fanout_limit(monkeypatch):
+    """Автор с тремя подписчиками популярен, с двумя — уже нет."""
+    monkeypatch.setattr(models, 'FEED_FANOUT_LIMIT', 2)
+    return 2
+
+
+def feed_ids(client):
+    response = client.get('/api/recipes/feed/?limit=100')
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+def test_feed_is_read_from_feed_items_in_index_order(me, data):
+    queryset = Recipe.objects.feed(data.me)
+    sql = str(queryset.query)
+
+    assert '"recipes_feeditem"."user_id" =' in sql
+    assert 'ORDER BY "recipes_feeditem"."pub_date" DESC' in sql
+    assert feed_ids(me) == list(
+        FeedItem.objects.filter(user=data.me).order_by(
+            '-pub_date', '-recipe_id').values_list('recipe_id', flat=True)
+    )
+
+
+def test_feed_includes_popular_authors_recipes(
+    me, data, fanout_limit, django_capture_on_commit_callbacks
+):
+    popular = data.stranger
+    for spare in data.spares[:fanout_limit]:
+        Follow.objects.create(user=spare, author=popular)
+    assert popular.id not in get_popular_author_ids()
+    Follow.objects.create(user=data.me, author=popular)
+    with django_capture_on_commit_callbacks(execute=True):
+        FeedItem.objects.backfill(data.me, popular)
+
+    assert not FeedItem.objects.filter(user=data.me, author=popular).exists()
+    assert popular.id in get_popular_author_ids()
+    assert set(data.stranger_recipe_ids) <= set(feed_ids(me))
+
+
+def test_unfollow_below_limit_backfills_remaining_followers(
+    me, data, fanout_limit, django_capture_on_commit_callbacks
+):
+    popular = data.stranger
+    for spare in data.spares:
+        Follow.objects.create(user=spare, author=popular)
+    assert models.is_popular_author(popular.id)
+    assert popular.id in get_popular_author_ids()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = data.clients['spare0'].delete(
+            f'/api/users/{popular.id}/subscribe/')
+
+    assert response.status_code == 204
+    assert not models.is_popular_author(popular.id)
+    for spare in data.spares[1:]:
+        assert set(FeedItem.objects.filter(
+            user=spare, author=popular
+        ).values_list('recipe_id', flat=True)) == set(
+            data.stranger_recipe_ids)
+    # Кэш набора популярных авторов устарел по версии.
+    assert popular.id not in get_popular_author_ids()
+
+
+def test_deleting_follower_backfills_former_popular_author(
+    data, fanout_limit, monkeypatch, django_capture_on_commit_callbacks
+):
+    monkeypatch.setattr(signals, 'FEED_FANOUT_LIMIT', fanout_limit)
+    popular = data.stranger
+    for spare in data.spares:
+        Follow.objects.create(user=spare, author=popular)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        data.spares[0].delete()
+
+    for spare in data.spares[1:]:
+        assert FeedItem.objects.filter(user=spare, author=popular).count() == 3
+
+
+def feed_count(client):
+    response = client.get('/api/recipes/feed/?limit=1')
+    assert response.status_code == 200
+    return response.json()['count']
+
+
+def test_feed_count_follows_bulk_feed_changes(
+    me, data, django_capture_on_commit_callbacks
+):
+    author = FeedItem.objects.filter(user=data.me).first().author
+    assert feed_count(me) == len(data.recipe_ids)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        FeedItem.objects.prune(data.me, author)
+    assert feed_count(me) == len(data.recipe_ids) - data.size
+
+    with django_capture_on_commit_callbacks(execute=True):
+        FeedItem.objects.backfill(data.me, author)
+    assert feed_count(me) == len(data.recipe_ids)
@@ -0,0 +1,62 @@
+import base64
+from io import BytesIO
+
+from django.core.management import call_command
+from PIL import Image
+from recipes.images import IMAGE_SIZES
+from recipes.models import Recipe
+from recipes.tests.factories import recipe_payload
+
+
+def png(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+def stored_size(recipe, size):
+    """Формат и размеры копии изображения в хранилище."""
+    with recipe.image.storage.open(recipe.image_sizes[size]) as file:
+        with Image.open(file) as image:
+            return image.format, image.size
+
+
+def test_uploaded_image_gets_webp_sizes(me, data):
+    payload = {**recipe_payload(data), 'image': png(1600, 800)}
+
+    response = me.post(
+        '/api/recipes/', payload, content_type='application/json')
+
+    assert response.status_code == 201
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    assert recipe.image_sizes.keys() == IMAGE_SIZES.keys()
+    for size, side in IMAGE_SIZES.items():
+        assert stored_size(recipe, size) == ('WEBP', (side, side // 2))
+        assert response.json()['images'][size].endswith(
+            recipe.image.storage.url(recipe.image_sizes[size]))
+    assert response.json()['image'].endswith(recipe.image.url)
+
+
+def test_small_image_is_not_enlarged(me, data):
+    response = me.post(
+        '/api/recipes/', {**recipe_payload(data), 'image': png(300, 100)},
+        content_type='application/json',
+    )
+
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    assert stored_size(recipe, 'thumbnail') == ('WEBP', (200, 67))
+    assert stored_size(recipe, 'full') == ('WEBP', (300, 100))
+
+
+def test_make_image_sizes_fills_missing_sizes(anon, data):
+    recipe_id = data.recipe_ids[0]
+    Recipe.objects.filter(pk=recipe_id).update(image_sizes={})
+
+    call_command('make_image_sizes')
+
+    recipe = Recipe.objects.get(pk=recipe_id)
+    assert recipe.image_sizes.keys() == IMAGE_SIZES.keys()
+    response = anon.get(f'/api/recipes/{recipe_id}/')
+    assert response.json()['images']['card'].endswith(
+        recipe.image.storage.url(recipe.image_sizes['card']))
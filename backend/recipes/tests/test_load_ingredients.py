@@ -0,0 +1,52 @@
+import pytest
+from django.core.management import CommandError, call_command
+from recipes.management.commands import load_ingredients
+from recipes.models import MAX_TAGS, Ingredient, Tag
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(load_ingredients, 'DATA_ROOT', str(tmp_path))
+    return tmp_path
+
+
+def load(data_root, filename, content):
+    (data_root / filename).write_text(content, encoding='utf-8')
+    call_command('load_ingredients', filename, '--batch-size', '2')
+
+
+def test_loading_ingredients_twice_keeps_one_copy(db, data_root):
+    Ingredient.objects.create(name='сахар', measurement_unit='г')
+    content = 'мука,г\nсоль,г\nмука,г\nсахар,г\nсоль,щепотка\n'
+
+    for _ in range(2):
+        load(data_root, 'ingredients.csv', content)
+
+    assert sorted(Ingredient.objects.values_list(
+        'name', 'measurement_unit')) == [
+        ('мука', 'г'), ('сахар', 'г'), ('соль', 'г'), ('соль', 'щепотка'),
+    ]
+
+
+def test_loading_tags_twice_keeps_their_bits(db, data_root):
+    content = 'Завтрак,#E26C2D,breakfast\nОбед,#49B64E,lunch\n'
+    load(data_root, 'tags.csv', content)
+    bits = dict(Tag.objects.values_list('slug', 'bit'))
+
+    load(data_root, 'tags.csv', content + 'Ужин,#8775D2,dinner\n')
+
+    assert dict(Tag.objects.values_list('slug', 'bit')) == {
+        **bits, 'dinner': 2,
+    }
+
+
+def test_loading_tags_beyond_free_bits_fails(db, data_root):
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {bit}', color=f'#{bit:06X}', slug=f'tag{bit}', bit=bit)
+        for bit in range(MAX_TAGS)
+    )
+
+    with pytest.raises(CommandError, match=f'больше {MAX_TAGS}'):
+        load(data_root, 'tags.csv', 'Ужин,#8775D2,dinner\n')
+
+    assert not Tag.objects.filter(slug='dinner').exists()
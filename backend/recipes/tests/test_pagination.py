@@ -0,0 +1,104 @@
+from django.utils import timezone
+from recipes.models import POPULAR_ORDERING, Favorites, Recipe
+from recipes.pagination import get_count
+from recipes.versions import bump_version
+from users.models import User
+
+
+def walk(client, url, link='next'):
+    """id рецептов на всех страницах по ссылкам next или previous."""
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append([recipe['id'] for recipe in response.json()['results']])
+        url = response.json()[link]
+    return pages
+
+
+def test_cursor_pages_through_tied_pub_dates(anon, data):
+    Recipe.objects.update(pub_date=timezone.now())
+    expected = list(
+        Recipe.objects.order_by('-pub_date', '-id').values_list(
+            'id', flat=True)
+    )
+
+    pages = walk(anon, '/api/recipes/?pagination=cursor&limit=4')
+
+    assert sum(pages, []) == expected
+    assert [len(page) for page in pages] == [4, 4, 4, 3]
+
+
+def test_cursor_previous_link_returns_same_pages(anon, data):
+    Recipe.objects.update(pub_date=timezone.now())
+    forward = walk(anon, '/api/recipes/?pagination=cursor&limit=4')
+    last = anon.get('/api/recipes/?pagination=cursor&limit=4')
+    for _ in forward[1:]:
+        last = anon.get(last.json()['next'])
+
+    backward = walk(anon, last.json()['previous'], link='previous')
+
+    assert backward == forward[-2::-1]
+
+
+def test_cursor_pages_through_feed(me, data):
+    expected = list(
+        Recipe.objects.filter(author_id__in=data.author_ids).order_by(
+            '-pub_date', '-id').values_list('id', flat=True)
+    )
+
+    pages = walk(me, '/api/recipes/feed/?pagination=cursor&limit=4')
+
+    assert sum(pages, []) == expected
+
+
+def test_cursor_rejects_malformed_position(anon, data):
+    response = anon.get('/api/recipes/?pagination=cursor&cursor=cD1bMV0=')
+
+    assert response.status_code == 404
+
+
+def test_cursor_pages_through_tied_popularity(anon, data):
+    Recipe.objects.update(favorites_count=1, pub_date=timezone.now())
+    Recipe.objects.filter(id__in=data.recipe_ids[:2]).update(
+        favorites_count=2)
+    expected = list(
+        Recipe.objects.order_by(*POPULAR_ORDERING).values_list(
+            'id', flat=True)
+    )
+
+    pages = walk(
+        anon, '/api/recipes/?pagination=cursor&ordering=popular&limit=4'
+    )
+
+    assert sum(pages, []) == expected
+    assert expected[:2] == sorted(data.recipe_ids[:2], reverse=True)
+
+
+def test_cursor_of_other_ordering_is_rejected(anon, data):
+    url = anon.get('/api/recipes/?pagination=cursor&limit=4').json()['next']
+
+    response = anon.get(url + '&ordering=popular')
+
+    assert response.status_code == 404
+
+
+def test_count_cache_ignores_unread_models(data):
+    queryset = Recipe.objects.filter(author=data.me)
+    assert get_count(queryset) == (3, True)
+
+    bump_version(User)
+    bump_version(Favorites)
+
+    assert get_count(queryset) == (3, False)
+
+
+def test_count_cache_follows_read_models(data):
+    queryset = Recipe.objects.filter(
+        favorites__user=data.me).order_by('id')
+    assert get_count(queryset) == (3, True)
+    Favorites.objects.create(user=data.me, recipe_id=data.my_recipe_ids[0])
+
+    bump_version(Favorites)
+
+    assert get_count(queryset) == (4, True)
@@ -0,0 +1,28 @@
+import pytest
+from recipes.models import RecipeQuerySet
+
+READ_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?is_in_shopping_cart=1',
+    '/api/recipes/?ordering=popular',
+    '/api/recipes/?pagination=cursor',
+    '/api/recipes/feed/',
+)
+
+
+@pytest.mark.parametrize('path', READ_PATHS)
+def test_recipe_list_within_query_budget(
+    me, path, django_assert_max_num_queries
+):
+    with django_assert_max_num_queries(RecipeQuerySet.READ_QUERY_BUDGET):
+        response = me.get(path)
+    assert response.status_code == 200
+
+
+def test_recipe_list_budget_does_not_depend_on_page_size(
+    me, django_assert_max_num_queries
+):
+    with django_assert_max_num_queries(RecipeQuerySet.READ_QUERY_BUDGET):
+        response = me.get('/api/recipes/?limit=100')
+    assert len(response.json()['results']) == 15
@@ -0,0 +1,214 @@
+import json
+
+import pytest
+from django.test import Client
+from recipes.models import (AmountIngredient, Favorites, Recipe,
+                            ShoppingListItem, Tag)
+from recipes.tests.factories import PASSWORD, recipe_payload
+from rest_framework.authtoken.models import Token
+
+
+def shopping_list(client):
+    response = client.get('/api/recipes/download_shopping_cart/?type=ndjson')
+    assert response.status_code == 200
+    return {
+        item['name']: item['total_amount']
+        for item in map(json.loads, b''.join(
+            response.streaming_content).decode().splitlines())
+    }
+
+
+def result_ids(response):
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+def test_shopping_list_sums_ingredients_of_cart(me, data):
+    assert shopping_list(me) == {
+        f'Ингредиент {number}': 30 for number in range(3)
+    }
+
+    me.post(f'/api/recipes/{data.stranger_recipe_ids[0]}/shopping_cart/')
+    assert set(shopping_list(me).values()) == {40}
+
+    me.delete(f'/api/recipes/{data.recipe_ids[0]}/shopping_cart/')
+    me.delete(f'/api/recipes/{data.recipe_ids[1]}/shopping_cart/')
+    assert set(shopping_list(me).values()) == {20}
+
+
+def test_shopping_list_follows_recipe_changes(me, data):
+    me.post(f'/api/recipes/{data.my_recipe_ids[0]}/shopping_cart/')
+
+    response = me.put(
+        f'/api/recipes/{data.my_recipe_ids[0]}/',
+        recipe_payload(data, data.size), content_type='application/json',
+    )
+
+    assert response.status_code == 200
+    # recipe_payload даёт ингредиентам количества 1, 2 и 3.
+    assert shopping_list(me) == {
+        **{f'Ингредиент {number}': 30 for number in range(3)},
+        **{f'Ингредиент {number}': number - 2 for number in range(3, 6)},
+    }
+
+
+def test_shopping_list_follows_deleted_author(me, data):
+    token = Token.objects.get(user_id=data.author_ids[0])
+    client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    response = client.delete(
+        '/api/users/me/', {'current_password': PASSWORD},
+        content_type='application/json',
+    )
+
+    assert response.status_code == 204
+    assert shopping_list(me) == {}
+    assert not ShoppingListItem.objects.exists()
+
+
+def test_shopping_list_follows_admin_edits(me, data):
+    recipe = Recipe.objects.get(pk=data.recipe_ids[0])
+    item = recipe.amount_ingredient.get(ingredient_id=data.ingredient_ids[0])
+    item.amount = 25
+    item.save()
+    AmountIngredient.objects.create(
+        recipe=recipe, ingredient_id=data.ingredient_ids[3], amount=5)
+    recipe.amount_ingredient.filter(
+        ingredient_id=data.ingredient_ids[1]).delete()
+
+    assert shopping_list(me) == {
+        'Ингредиент 0': 45, 'Ингредиент 1': 20, 'Ингредиент 2': 30,
+        'Ингредиент 3': 5,
+    }
+
+    Recipe.objects.filter(pk__in=data.recipe_ids[1:3]).delete()
+    assert shopping_list(me) == {
+        'Ингредиент 0': 25, 'Ингредиент 2': 10, 'Ингредиент 3': 5,
+    }
+
+
+def test_shopping_list_rejects_unknown_format(me):
+    response = me.get('/api/recipes/download_shopping_cart/?type=pdf')
+
+    assert response.status_code == 400
+    assert 'errors' in response.json()
+
+
+def test_favorite_counts_recipe_popularity(data):
+    recipe_id = data.recipe_ids[0]
+    client = data.clients['spare0']
+
+    for _ in range(2):
+        assert client.post(
+            f'/api/recipes/{recipe_id}/favorite/').status_code == 201
+
+    assert Recipe.objects.get(pk=recipe_id).favorites_count == 2
+    popular = result_ids(client.get('/api/recipes/?ordering=popular&limit=4'))
+    assert popular[0] == recipe_id
+
+    assert client.delete(
+        f'/api/recipes/{recipe_id}/favorite/').status_code == 204
+    assert Recipe.objects.get(pk=recipe_id).favorites_count == 1
+
+
+def test_counters_follow_admin_and_cascade_deletes(data):
+    recipes = Recipe.objects.filter(pk__in=data.recipe_ids[:data.size])
+
+    def counters():
+        return set(recipes.values_list('favorites_count', 'in_carts_count'))
+
+    assert counters() == {(1, 1)}
+
+    Favorites.objects.filter(recipe__in=recipes).delete()
+    assert counters() == {(0, 1)}
+
+    data.me.delete()
+    assert counters() == {(0, 0)}
+
+
+def test_tag_filters_use_recipe_tag_masks(anon, data):
+    tag = Tag.objects.get(slug='tag0')
+    untagged = Recipe.objects.get(pk=data.recipe_ids[0])
+    untagged.tags.remove(tag)
+    untagged.refresh_from_db()
+    assert untagged.tag_mask == sum(
+        1 << bit for bit in Tag.objects.exclude(pk=tag.pk).values_list(
+            'bit', flat=True)
+    )
+
+    any_tag = result_ids(anon.get('/api/recipes/?limit=100&tags=tag0'))
+    all_tags = result_ids(
+        anon.get('/api/recipes/?limit=100&all_tags=tag0&all_tags=tag1'))
+    either = result_ids(
+        anon.get('/api/recipes/?limit=100&tags=tag0&tags=tag1'))
+
+    assert untagged.id not in any_tag and len(any_tag) == 14
+    assert untagged.id not in all_tags and len(all_tags) == 14
+    assert untagged.id in either and len(either) == 15
+
+
+def test_deleted_tag_is_cleared_from_masks(anon, data):
+    Tag.objects.get(slug='tag2').delete()
+
+    assert set(Recipe.objects.values_list('tag_mask', flat=True)) == {0b11}
+
+
+def test_pantry_ranks_by_missing_ingredients(
+    me, data, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        response = me.post(
+            '/api/recipes/', recipe_payload(data, data.size),
+            content_type='application/json',
+        )
+    assert response.status_code == 201
+    new_id = response.json()['id']
+    pantry = '&'.join(
+        f'ingredients={ingredient_id}'
+        for ingredient_id in data.ingredient_ids[:4]
+    )
+
+    response = me.get(f'/api/recipes/pantry/?limit=100&{pantry}')
+
+    results = response.json()['results']
+    assert [recipe['missing_ingredients'] for recipe in results] == (
+        [0] * 15 + [2]
+    )
+    assert results[-1]['id'] == new_id
+    assert result_ids(me.get(
+        f'/api/recipes/pantry/?limit=100&max_missing=1&{pantry}'
+    )) == sorted(Recipe.objects.exclude(pk=new_id).values_list(
+        'id', flat=True), reverse=True)
+
+
+def test_pantry_rejects_non_numeric_ingredients(me):
+    response = me.get('/api/recipes/pantry/?ingredients=salt')
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('query', ('', '?pagination=cursor'))
+def test_trending_follows_rank(anon, data, query):
+    assert result_ids(anon.get(f'/api/recipes/trending/{query}')) == (
+        data.recipe_ids[:3]
+    )
+
+
+def test_similar_lists_neighbours_by_rank(anon, data):
+    response = anon.get(f'/api/recipes/{data.recipe_ids[0]}/similar/')
+
+    assert response.status_code == 200
+    assert [recipe['id'] for recipe in response.json()] == (
+        data.my_recipe_ids + data.stranger_recipe_ids
+    )[:3]
+
+
+@pytest.mark.parametrize('recipe, status', (('known', 200), ('unknown', 404)))
+def test_similar_without_neighbours(anon, data, recipe, status):
+    recipe_id = data.recipe_ids[-1] if recipe == 'known' else 0
+
+    response = anon.get(f'/api/recipes/{recipe_id}/similar/')
+
+    assert response.status_code == status
+    if status == 200:
+        assert response.json() == []
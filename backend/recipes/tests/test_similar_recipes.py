@@ -0,0 +1,59 @@
+from django.core.management import call_command
+from recipes.models import (AmountIngredient, Recipe, SimilarRecipe,
+                            SimilarRecipesBuild)
+
+
+def build(*args):
+    call_command('build_similar_recipes', '--workers', '1', *args)
+    return {
+        recipe_id: list(SimilarRecipe.objects.filter(
+            recipe_id=recipe_id).values_list('similar_id', flat=True))
+        for recipe_id in SimilarRecipe.objects.values_list(
+            'recipe_id', flat=True)
+    }
+
+
+def share_ingredient(data, ingredient, *recipe_ids):
+    for recipe_id in recipe_ids:
+        AmountIngredient.objects.create(
+            recipe_id=recipe_id, ingredient_id=data.ingredient_ids[ingredient],
+            amount=1,
+        )
+
+
+def test_full_build_lists_recipes_with_shared_ingredients(data):
+    first, second, third, fourth = data.recipe_ids[:4]
+    share_ingredient(data, 3, first, second)
+    share_ingredient(data, 4, third, fourth)
+
+    # Общие для всех рецептов ингредиенты и теги близости не дают.
+    assert build() == {
+        first: [second], second: [first], third: [fourth], fourth: [third],
+    }
+    run = SimilarRecipesBuild.objects.get()
+    assert run.full
+    assert run.recipes == len(Recipe.objects.all())
+    assert set(SimilarRecipe.objects.values_list(
+        'built_at', flat=True)) == {run.built_at}
+
+
+def test_incremental_build_follows_changed_recipes(
+        data, django_capture_on_commit_callbacks):
+    first, second, third = data.recipe_ids[:3]
+    share_ingredient(data, 3, first, second)
+    build('--full')
+
+    share_ingredient(data, 3, third)
+    with django_capture_on_commit_callbacks(execute=True):
+        Recipe.objects.get(pk=third).save()
+    lists = build()
+
+    assert sorted(lists[third]) == [first, second]
+    assert sorted(lists[first]) == [second, third]
+    latest = SimilarRecipesBuild.objects.first()
+    assert not latest.full
+    assert latest.recipes < len(Recipe.objects.all())
+
+    # Запуск без изменений тоже сдвигает время расчёта.
+    assert build() == lists
+    assert SimilarRecipesBuild.objects.first().built_at > latest.built_at
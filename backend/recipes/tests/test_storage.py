@@ -0,0 +1,27 @@
+import os
+
+from django.core.files.base import ContentFile
+from recipes.storage import ContentAddressedStorage
+
+
+def test_duplicate_is_stored_once_and_touched():
+    storage = ContentAddressedStorage()
+    name = storage.save('recipes/images/a.png', ContentFile(b'image'))
+    os.utime(storage.path(name), (0, 0))
+
+    duplicate = storage.save('recipes/images/b.PNG', ContentFile(b'image'))
+
+    assert duplicate == name
+    assert name.endswith('.png') and len(storage.listdir(
+        os.path.dirname(name))[1]) == 1
+    assert os.path.getmtime(storage.path(name)) > 0
+
+
+def test_deleted_duplicate_is_written_again():
+    storage = ContentAddressedStorage()
+    name = storage.save('recipes/images/a.png', ContentFile(b'image'))
+    storage.delete(name)
+
+    assert storage.save(
+        'recipes/images/a.png', ContentFile(b'image')) == name
+    assert storage.exists(name)
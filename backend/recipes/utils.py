@@ -0,0 +1,40 @@
+import csv
+import json
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(items):
+    """Построчно отдаёт список покупок в текстовом формате."""
+    for item in items:
+        yield '{} - {} {}.\n'.format(
+            item['name'], item['total_amount'], item['measurement_unit']
+        )
+
+
+def render_csv(items):
+    """Построчно отдаёт список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for item in items:
+        yield writer.writerow(
+            (item['name'], item['total_amount'], item['measurement_unit'])
+        )
+
+
+def render_ndjson(items):
+    """Построчно отдаёт список покупок в формате NDJSON."""
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (render_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
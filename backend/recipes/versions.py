@@ -0,0 +1,42 @@
+import os
+import uuid
+
+from django.conf import settings
+
+
+def _stamp_path(model, key=None):
+    name = model._meta.label_lower
+    if key is not None:
+        name = f'{name}.{key}'
+    return os.path.join(settings.VERSION_STAMPS_ROOT, f'{name}.stamp')
+
+
+def get_version(model, key=None):
+    """
+    Возвращает текущую версию данных модели или, если задан key,
+    одного её объекта.
+    Версия — это (inode, mtime) файла-метки, общего для всех воркеров
+    на сервере, поэтому её чтение не требует запросов к базе.
+    Объект, версию которого ещё не меняли, имеет версию '0'.
+    """
+    try:
+        stat = os.stat(_stamp_path(model, key))
+    except FileNotFoundError:
+        if key is not None:
+            return '0'
+        bump_version(model)
+        stat = os.stat(_stamp_path(model))
+    return f'{stat.st_ino:x}-{stat.st_mtime_ns:x}'
+
+
+def bump_version(model, key=None):
+    """
+    Атомарно подменяет файл-метку, меняя версию данных модели
+    или одного её объекта.
+    """
+    os.makedirs(settings.VERSION_STAMPS_ROOT, exist_ok=True)
+    path = _stamp_path(model, key)
+    tmp_path = f'{path}.{uuid.uuid4().hex}'
+    with open(tmp_path, 'w') as file:
+        file.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
@@ -1,59 +1,255 @@
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from recipes import serializers
-from recipes.filters import IngredientSearchFilter, RecipeFilterSet
-from recipes.models import (AmountIngredient, Cart, Favorites, Ingredient,
-                            Recipe, Tag)
-from recipes.pagination import CustomPagination
+from recipes.activity import record_event
+from recipes.filters import RecipeFilterSet
+from recipes.ingredient_index import get_ingredient_index
+from recipes.mixins import ConditionalGetMixin
+from recipes.models import (Cart, Favorites, Ingredient, Recipe,
+                            ShoppingListItem, SimilarRecipe, Tag,
+                            TrendingRecipe)
+from recipes.pagination import (CustomPagination, RecipeCursorPagination,
+                                get_count)
+from recipes.pantry_index import get_pantry_index
 from recipes.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from recipes.utils import SHOPPING_LIST_FORMATS
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from users.models import User
+from users.models import Follow
 
+# Вид события для счётчиков популярности RecipeActivity.
+ACTIVITY_EVENTS = {
+    Favorites: 'favorites',
+    Cart: 'carts',
+}
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagsViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Работает с тегами. Теги может создавать только админ"""
+    etag_models = (Tag,)
+    cache_max_age = 300
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Работает с ингредиентами. Ингредиенты может создавать только админ"""
+    etag_models = (Ingredient,)
+    cache_max_age = 300
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
-    filter_backends = (IngredientSearchFilter,)
     permission_classes = (IsAdminOrReadOnly,)
-    search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request):
+        """
+        Ищет ингредиенты по началу названия (параметр name) в индексе
+        в памяти воркера, limit ограничивает число результатов.
+        """
+        limit = request.query_params.get('limit')
+        try:
+            limit = int(limit) if limit else None
+            if limit is not None and limit < 0:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'errors': 'limit должен быть неотрицательным числом.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return HttpResponse(
+            get_ingredient_index().search(
+                request.query_params.get('name', ''), limit
+            ),
+            content_type='application/json'
+        )
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Работает с рецептами."""
-    queryset = Recipe.objects.all()
+    # Ингредиенты рецептов и данные авторов меняют версию рецептов,
+    # поэтому без авторизации ответ зависит только от этих моделей.
+    etag_models = (Recipe, Tag, Ingredient)
+    # Флаги is_favorited, is_in_shopping_cart и is_subscribed
+    # есть только в ответах авторизованным пользователям.
+    user_etag_models = (Favorites, Cart, Follow)
+    action_etag_models = {
+        'trending': (TrendingRecipe,),
+        'similar': (SimilarRecipe,),
+    }
+    etag_actions = ('list', 'retrieve', 'count', 'trending', 'similar')
+    cursor_actions = ('list', 'feed')
+    cache_max_age = 10
     serializer_class = serializers.RecipeSerializer
     pagination_class = CustomPagination
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filter_class = RecipeFilterSet
 
+    def get_etag_models(self, request, action):
+        """
+        ETag считается до аутентификации, поэтому авторизованный
+        запрос узнаётся по заголовку Authorization. Порядок
+        ordering=popular зависит от счётчиков избранного.
+        """
+        models = self.etag_models + self.action_etag_models.get(action, ())
+        if 'HTTP_AUTHORIZATION' in request.META:
+            models += self.user_etag_models
+        elif request.GET.get('ordering') == 'popular':
+            models += (Favorites,)
+        return models
+
+    @property
+    def paginator(self):
+        """
+        Включает постраничный вывод по курсору при pagination=cursor.
+        Курсор сортирует по дате или популярности, поэтому он есть
+        только в cursor_actions; остальные списки идут в своём порядке
+        (рейтинг, число недостающих ингредиентов) постранично.
+        """
+        if not hasattr(self, '_paginator'):
+            if (
+                self.request.query_params.get('pagination') == 'cursor'
+                and self.action in self.cursor_actions
+            ):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        """
+        Рецепты с флагами текущего пользователя, при ordering=popular —
+        по убыванию числа добавлений в избранное.
+        """
+        queryset = Recipe.objects.for_read().with_user_flags(
+            self.request.user
+        )
+        if self.request.query_params.get('ordering') == 'popular':
+            return queryset.popular()
+        return queryset
+
+    @action(detail=False, methods=('get',))
+    def count(self, request):
+        """
+        Количество рецептов с учётом фильтров для клиентов,
+        которые листают рецепты по курсору.
+        Количество может быть закэшированным или приблизительным.
+        """
+        count, count_exact = get_count(self.filter_queryset(
+            Recipe.objects.with_user_flags(request.user)
+        ))
+        return Response({'count': count, 'count_exact': count_exact})
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        record_event(response.data['id'], 'views')
+        return response
+
+    @action(detail=False, methods=('get',))
+    def trending(self, request):
+        """
+        Рецепты, популярные за последние дни, в порядке рейтинга.
+        Рейтинг заранее считает команда materialize_trending.
+        """
+        queryset = self.filter_queryset(
+            self.get_queryset().filter(
+                trending__isnull=False
+            ).order_by('trending__rank')
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=('get',))
+    def similar(self, request, pk):
+        """
+        Похожие рецепты по ингредиентам и тегам, от самого похожего.
+        Списки заранее считает команда build_similar_recipes,
+        здесь это одно чтение по индексу (recipe, rank).
+        """
+        data = serializers.FavoritesSerializer(
+            Recipe.objects.filter(
+                neighbour_of__recipe_id=pk
+            ).order_by('neighbour_of__rank'),
+            many=True,
+        ).data
+        if not data:
+            get_object_or_404(Recipe, pk=pk)
+        return Response(data)
+
+    @action(detail=False, methods=('get',))
+    def pantry(self, request):
+        """
+        Рецепты из ингредиентов ingredients: сначала те, для которых
+        есть всё, затем те, где не хватает одного, двух и т.д.
+        max_missing ограничивает число недостающих ингредиентов.
+        Рейтинг считается по индексу в памяти воркера.
+        """
+        try:
+            pantry = {
+                int(value)
+                for value in request.query_params.getlist('ingredients')
+            }
+            max_missing = request.query_params.get('max_missing')
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            return Response(
+                {'errors': 'ingredients и max_missing должны быть числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        page = self.paginate_queryset(
+            get_pantry_index().rank(pantry, max_missing)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        for recipe_id, missing in page:
+            if recipe_id in recipes:
+                recipes[recipe_id].missing_ingredients = missing
+        serializer = serializers.PantryRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _ in page
+             if recipe_id in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=('get',),
+            permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        queryset = self.filter_queryset(
+            self.get_queryset().feed(request.user)
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
     def __get_add_delete_recipe(self, model, request, pk):
         """
         Вызывается методом: favorite, shopping_cart.
         Проверяет наличие рецепта в избранных или корзине
         после добавляет или удаляет его.
+        Список покупок и счётчики рецепта меняются сигналами.
         """
-        user = get_object_or_404(User, username=request.user)
+        user = request.user
         recipe = get_object_or_404(Recipe, id=pk)
         if request.method == 'POST':
-            model.objects.get_or_create(user=user, recipe=recipe)
+            _, created = model.objects.get_or_create(user=user, recipe=recipe)
+            if created:
+                record_event(recipe.pk, ACTIVITY_EVENTS[model])
             serializer = serializers.FavoritesSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         get_object_or_404(model, user=user, recipe=recipe).delete()
@@ -75,31 +271,32 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request):
         """
-        Список покупок скачивается в формате .txt.
+        Список покупок скачивается в формате .txt, .csv или .ndjson
+        (параметр type, по умолчанию txt).
         Пользователь получает файл с суммированным перечнем
         и количеством необходимых ингредиентов для всех рецептов.
+        Перечень читается из заранее посчитанной таблицы ShoppingListItem
+        и отдаётся построчно.
         """
-        carts = get_object_or_404(User, username=request.user).cart.all()
-        ingredients_set = {}
-
-        for item in carts:
-            ingredients = AmountIngredient.objects.filter(recipe=item.recipe)
-
-            for ingredient in ingredients:
-                amount = ingredient.amount
-                name = ingredient.ingredient.name
-                measurement_unit = ingredient.ingredient.measurement_unit
-                if name not in ingredients_set:
-                    ingredients_set[name] = {
-                        'amount': amount,
-                        'measurement_unit': measurement_unit,
-                    }
-                else:
-                    ingredients_set[name]['amount'] += amount
-
-        cart_list = ['{} - {} {}.\n'.format(
-            name, ingredients_set[name]['amount'],
-            ingredients_set[name]['measurement_unit'],
-        ) for name in ingredients_set]
-
-        return HttpResponse(cart_list, content_type='text/plain')
+        file_type = request.query_params.get('type', 'txt')
+        if file_type not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: {}.'.format(
+                    ', '.join(SHOPPING_LIST_FORMATS))},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        render, content_type = SHOPPING_LIST_FORMATS[file_type]
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).values(
+            'total_amount',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        ).order_by('name', 'measurement_unit')
+        response = StreamingHttpResponse(
+            render(items.iterator()), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_type}"'
+        )
+        return response
@@ -0,0 +1,82 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from foodgram.routers import use_replicas
+from recipes.versions import get_version
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+
+class TokenCache:
+    """
+    Ограниченный по размеру и времени жизни LRU-кеш token -> user
+    в памяти воркера.
+    Кеш целиком сбрасывается, когда меняется версия данных токенов,
+    а запись пользователя — когда меняется его собственная версия,
+    поэтому выход из системы и изменение пользователя в одном
+    воркере видны во всех остальных.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает (user, token) или None."""
+        version = get_version(Token)
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+                return None
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            credentials, expires, user_version = entry
+            if (
+                expires < time.monotonic()
+                or user_version != get_version(User, credentials[0].pk)
+            ):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return credentials
+
+    def set(self, key, credentials):
+        user_version = get_version(User, credentials[0].pk)
+        with self.lock:
+            expires = time.monotonic() + self.timeout
+            self.entries[key] = (credentials, expires, user_version)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TIMEOUT
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без запроса к базе для уже известных
+    воркеру токенов. Каждый запрос получает свою копию пользователя.
+    Неизвестный токен ищется в основной базе: только что выданного
+    токена на реплике может ещё не быть.
+    """
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            with use_replicas(False):
+                credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+        user, token = credentials
+        return copy.copy(user), token
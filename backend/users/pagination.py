@@ -1,6 +1,6 @@
-from rest_framework.pagination import PageNumberPagination
+from recipes.pagination import CachedCountPagination
 
 
-class UserPagination(PageNumberPagination):
+class UserPagination(CachedCountPagination):
     page_size = 6
     page_size_query_param = 'limit'
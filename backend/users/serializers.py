@@ -1,5 +1,5 @@
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from recipes.fields import ImageSizeField
 from recipes.models import Recipe
 from rest_framework.serializers import (ModelSerializer, ReadOnlyField,
                                         SerializerMethodField, ValidationError)
@@ -43,14 +43,25 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, author):
-        """Проверяет подписан ли текущий пользователь на автора."""
+        """
+        Проверяет подписан ли текущий пользователь на автора.
+        Использует аннотацию is_subscribed, если она есть.
+        """
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
         user = self.context.get('request').user
         return not user.is_anonymous and Follow.objects.filter(
             user=user, author=author).exists()
 
 
+def get_recipes_limit(request):
+    """Возвращает параметр recipes_limit или None, если он не задан."""
+    limit = request.query_params.get('recipes_limit', '')
+    return int(limit) if limit.isdigit() else None
+
+
 class FollowRecipeSerializer(ModelSerializer):
-    image = Base64ImageField()
+    image = ImageSizeField('thumbnail')
 
     class Meta:
         model = Recipe
@@ -72,23 +83,30 @@ class FollowSerializer(ModelSerializer):
         fields = ('id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
 
-    def get_is_subscribed(self, author):
+    def get_is_subscribed(self, follow):
         """Проверяет подписан ли текущий пользователь на автора."""
         user = self.context.get('request').user
-        return not user.is_anonymous and Follow.objects.filter(
-            user=user, author=author.author).exists()
-
-    def get_recipes(self, author):
-        """Отображает рецепты в мои подписки."""
+        return follow.user_id == user.id
+
+    def get_recipes(self, follow):
+        """
+        Отображает рецепты в мои подписки.
+        Использует рецепты, подгруженные для всей страницы подписок
+        в preview_recipes, если они есть.
+        """
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        limit = request.query_params.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=author.author)
-        if limit:
-            recipes = recipes.all()[:int(limit)]
+        recipes = getattr(follow.author, 'preview_recipes', None)
+        if recipes is None:
+            recipes = Recipe.objects.filter(author=follow.author)
+            limit = get_recipes_limit(request)
+            if limit is not None:
+                recipes = recipes[:limit]
         return FollowRecipeSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, author):
+    def get_recipes_count(self, follow):
         """Показывает количество рецептов у автора."""
-        return Recipe.objects.filter(author=author.author).count()
+        if hasattr(follow, 'recipes_count'):
+            return follow.recipes_count
+        return Recipe.objects.filter(author=follow.author).count()
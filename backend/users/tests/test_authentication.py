@@ -0,0 +1,70 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.tests.factories import PASSWORD
+from rest_framework.authtoken.models import Token
+from users.models import MyToken
+
+
+def token_queries(client):
+    """Запросы к таблице токенов при запросе профиля."""
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/users/me/')
+    assert response.status_code == 200
+    return [
+        query['sql'] for query in queries
+        if Token._meta.db_table in query['sql']
+    ]
+
+
+def test_token_deleted_in_admin_is_revoked(
+    me, data, django_capture_on_commit_callbacks
+):
+    assert me.get('/api/users/me/').status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True):
+        MyToken.objects.filter(user=data.me).delete()
+
+    assert me.get('/api/users/me/').status_code == 401
+
+
+def test_logout_revokes_token(data, django_capture_on_commit_callbacks):
+    client = data.clients['spare2']
+    assert client.get('/api/users/me/').status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post('/api/auth/token/logout/')
+
+    assert client.get('/api/users/me/').status_code == 401
+
+
+def test_login_keeps_cached_tokens(
+    me, anon, data, django_capture_on_commit_callbacks
+):
+    token_queries(me)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = anon.post('/api/auth/token/login/', {
+            'email': data.spares[2].email, 'password': PASSWORD,
+        })
+
+    assert response.status_code == 200
+    assert token_queries(me) == []
+
+
+def test_user_change_evicts_only_that_user(
+    me, data, django_capture_on_commit_callbacks
+):
+    other = data.clients['spare0']
+    token_queries(me)
+    token_queries(other)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = me.patch(
+            '/api/users/me/', {'first_name': 'Другое'},
+            content_type='application/json',
+        )
+
+    assert response.status_code == 200
+    assert token_queries(me) != []
+    assert token_queries(other) == []
+    assert me.get('/api/users/me/').json()['first_name'] == 'Другое'
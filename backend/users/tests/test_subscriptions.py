@@ -0,0 +1,22 @@
+from recipes.models import Recipe
+
+
+def test_subscriptions_show_latest_recipes_of_each_author(me, data):
+    response = me.get('/api/users/subscriptions/?recipes_limit=2')
+
+    assert response.status_code == 200
+    authors = response.json()['results']
+    assert [author['id'] for author in authors] == data.author_ids
+    for author in authors:
+        latest = list(Recipe.objects.filter(author_id=author['id']).order_by(
+            '-pub_date', '-id').values_list('id', flat=True)[:2])
+        assert [recipe['id'] for recipe in author['recipes']] == latest
+        assert author['recipes_count'] == 3
+
+
+def test_subscriptions_without_limit_show_all_recipes(me, data):
+    response = me.get('/api/users/subscriptions/')
+
+    assert [
+        len(author['recipes']) for author in response.json()['results']
+    ] == [3, 3, 3]
@@ -1,5 +1,9 @@
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, OuterRef, Prefetch,
+                              Value, prefetch_related_objects)
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
+from recipes.models import FeedItem, Recipe
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
@@ -13,9 +17,21 @@ class FollowViewSet(UserViewSet):
     """Работает с пользователями."""
     pagination_class = UserPagination
 
+    def get_queryset(self):
+        """Аннотирует пользователей флагом подписки текущего пользователя."""
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+
     def __get_add_delete_follow(self, request, id):
         """Создаёт или удаляет связь между пользователями."""
-        user = get_object_or_404(User, username=request.user)
+        user = request.user
         author = get_object_or_404(User, id=id)
         if user == author:
             return Response(
@@ -28,12 +44,16 @@ class FollowViewSet(UserViewSet):
                     {'errors': 'Вы уже подписаны на этого автора.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            follow = Follow.objects.create(user=user, author=author)
+            with transaction.atomic():
+                follow = Follow.objects.create(user=user, author=author)
+                FeedItem.objects.backfill(user, author)
             serializer = serializers.FollowSerializer(
                 follow, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        get_object_or_404(Follow, user=user, author=author).delete()
+        with transaction.atomic():
+            get_object_or_404(Follow, user=user, author=author).delete()
+            FeedItem.objects.prune(user, author)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=('post',), detail=True,
@@ -50,12 +70,30 @@ class FollowViewSet(UserViewSet):
     @action(methods=('get',), detail=False,
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
-        """Список подписок пользователя."""
+        """
+        Список подписок пользователя.
+        Число рецептов авторов считается в том же запросе,
+        а первые recipes_limit рецептов всех авторов страницы
+        подгружаются одним запросом.
+        """
         user = request.user
         if user.is_anonymous:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(user=user).select_related(
+            'author'
+        ).annotate(
+            recipes_count=Count('author__recipes')
+        ).order_by('author')
         pages = self.paginate_queryset(queryset)
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        limit = serializers.get_recipes_limit(request)
+        if limit is not None:
+            recipes = recipes.latest_by_author(
+                [follow.author_id for follow in pages], limit
+            )
+        prefetch_related_objects(pages, Prefetch(
+            'author__recipes', queryset=recipes, to_attr='preview_recipes'
+        ))
         serializer = serializers.FollowSerializer(
             pages, many=True, context={'request': request}
         )